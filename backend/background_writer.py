@@ -0,0 +1,65 @@
+"""
+后台写入器
+
+计算阶段把产出文件（JSON、CSV、图片、HTML、模型、报告）交给线程池写盘，主流程结束前统一等待。
+本模块只依赖Python标准库；图像对象只需提供 savefig()。
+"""
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundWriter:
+    """
+    后台I/O线程池
+    - submit() 提交写盘任务后立即返回，计算阶段继续执行
+    - 图表在调用线程中渲染为字节（matplotlib/pyecharts非线程安全），只把写文件放到后台
+    - flush() 为最终屏障：等待全部任务完成并汇总错误
+    """
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artifact-writer')
+        self.pending = []
+
+    def submit(self, description, func, *args, **kwargs):
+        """提交一个写盘任务"""
+        future = self.executor.submit(func, *args, **kwargs)
+        self.pending.append((description, future))
+        return future
+
+    @staticmethod
+    def write_text_file(path, text):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    @staticmethod
+    def write_bytes_file(path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def save_figure(self, description, fig, path, **savefig_kwargs):
+        """在当前线程渲染图像，后台写文件；调用后图像即可关闭"""
+        buffer = io.BytesIO()
+        fig.savefig(buffer, **savefig_kwargs)
+        return self.submit(description, self.write_bytes_file, path, buffer.getvalue())
+
+    def flush(self):
+        """等待所有写盘任务完成，返回 [(描述, 异常), ...]"""
+        start = time.perf_counter()
+        errors = []
+        for description, future in self.pending:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((description, e))
+                print(f"⚠️  写入失败 [{description}]: {str(e)}")
+        print(f"✓ 后台写入完成: {len(self.pending) - len(errors)}/{len(self.pending)} 个文件，"
+              f"等待 {time.perf_counter() - start:.2f} 秒")
+        self.pending = []
+        return errors
+
+    def close(self):
+        errors = self.flush()
+        self.executor.shutdown(wait=True)
+        return errors
@@ -0,0 +1,163 @@
+"""
+紧凑模型文件与NumPy向量化推理
+
+把训练好的最佳模型展平成纯NumPy数组（.npz，不压缩，可直接加载）：
+- 线性模型：系数、截距
+- 随机森林 / 梯度提升：所有树的节点特征、阈值、子节点、叶子值拼接成全局节点数组
+
+本模块只依赖NumPy，推理端无需安装或导入sklearn。
+"""
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def _flatten_trees(trees):
+    """把多棵sklearn决策树拼接为全局节点数组，子节点下标换算为全局下标"""
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        t = tree.tree_
+        n_nodes = t.node_count
+        is_leaf = t.children_left == -1
+        node_ids = np.arange(n_nodes)
+
+        # 叶子节点的左右子节点指向自身，遍历到叶子后停在原地
+        left = np.where(is_leaf, node_ids, t.children_left) + offset
+        right = np.where(is_leaf, node_ids, t.children_right) + offset
+
+        features.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+        thresholds.append(t.threshold.astype(np.float64))
+        children.append(np.stack([left, right], axis=1).astype(np.int32))
+        values.append(t.value.reshape(n_nodes, -1)[:, 0].astype(np.float64))
+        roots.append(offset)
+
+        offset += n_nodes
+        max_depth = max(max_depth, int(t.max_depth))
+
+    return {
+        'tree_feature': np.concatenate(features),
+        'tree_threshold': np.concatenate(thresholds),
+        'tree_children': np.concatenate(children),
+        'tree_value': np.concatenate(values),
+        'tree_roots': np.asarray(roots, dtype=np.int32),
+        'tree_max_depth': np.asarray(max_depth, dtype=np.int32),
+    }
+
+
+def flatten_model(model, scaler, feature_columns, model_name=''):
+    """
+    将sklearn模型展平为NumPy数组字典
+    - 支持 LinearRegression 等线性模型、RandomForestRegressor、GradientBoostingRegressor（平方误差）
+    - 通过属性识别模型类型，本函数本身不导入sklearn
+    """
+    arrays = {
+        'format_version': np.asarray(FORMAT_VERSION, dtype=np.int32),
+        'model_name': np.asarray(model_name),
+        'feature_columns': np.asarray(list(feature_columns)),
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64),
+    }
+
+    if hasattr(model, 'coef_'):
+        arrays['kind'] = np.asarray('linear')
+        arrays['coef'] = np.asarray(model.coef_, dtype=np.float64).ravel()
+        arrays['intercept'] = np.asarray(model.intercept_, dtype=np.float64).ravel()[:1]
+    elif hasattr(model, 'learning_rate') and hasattr(model, 'init_'):
+        # 梯度提升：预测值 = 初始常数 + 学习率 × 各树输出之和
+        arrays['kind'] = np.asarray('boosting')
+        arrays.update(_flatten_trees(model.estimators_[:, 0]))
+        init = 0.0 if model.init_ == 'zero' else float(np.ravel(model.init_.constant_)[0])
+        arrays['init'] = np.asarray(init, dtype=np.float64)
+        arrays['learning_rate'] = np.asarray(model.learning_rate, dtype=np.float64)
+    elif hasattr(model, 'estimators_'):
+        # 随机森林：预测值 = 各树输出的平均
+        arrays['kind'] = np.asarray('forest')
+        arrays.update(_flatten_trees(model.estimators_))
+    else:
+        raise ValueError(f"不支持导出的模型类型: {type(model).__name__}")
+
+    return arrays
+
+
+def save_compact_model(path, arrays):
+    """保存为不压缩的 .npz，加载时无需解压"""
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    return path
+
+
+def export_compact_model(model, scaler, feature_columns, path, model_name=''):
+    """展平并保存sklearn模型"""
+    return save_compact_model(path, flatten_model(model, scaler, feature_columns, model_name))
+
+
+class CompactPricePredictor:
+    """
+    紧凑模型推理器（仅依赖NumPy）
+    - load() 读取 .npz，毫秒级完成
+    - predict() 对一批样本向量化推理：树模型按层同时推进一批样本的所有树
+    """
+
+    def __init__(self, arrays, chunk_rows=2048):
+        self.kind = str(arrays['kind'])
+        self.model_name = str(arrays['model_name'])
+        self.feature_columns = [str(col) for col in arrays['feature_columns']]
+        self.mean = arrays['scaler_mean']
+        self.scale = arrays['scaler_scale']
+        self.arrays = arrays
+        self.chunk_rows = chunk_rows
+
+        if self.kind != 'linear':
+            # 下标预先转为 intp，遍历时 np.take 无需再做类型转换
+            self._feature = arrays['tree_feature'].astype(np.intp)
+            self._children = arrays['tree_children'].astype(np.intp).ravel()
+            self._roots = arrays['tree_roots'].astype(np.intp)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+        if int(arrays['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"不支持的紧凑模型格式版本: {int(arrays['format_version'])}")
+        return cls(arrays)
+
+    def _tree_outputs(self, X):
+        """返回 (样本数, 树数) 的叶子值矩阵"""
+        threshold = self.arrays['tree_threshold']
+        value = self.arrays['tree_value']
+        max_depth = int(self.arrays['tree_max_depth'])
+        n_features = X.shape[1]
+
+        # sklearn树在float32上比较阈值，这里保持一致
+        X = X.astype(np.float32).astype(np.float64)
+        outputs = np.empty((len(X), len(self._roots)))
+
+        # 按行分块，使每层的临时数组留在缓存中
+        for start in range(0, len(X), self.chunk_rows):
+            flat = X[start:start + self.chunk_rows].ravel()
+            row_offset = (np.arange(len(flat) // n_features) * n_features)[:, None]
+            node = np.broadcast_to(self._roots, (len(row_offset), len(self._roots))).copy()
+            for _ in range(max_depth):
+                x = np.take(flat, row_offset + np.take(self._feature, node))
+                # children 按 [左, 右] 交错存放：x > 阈值 时走右子节点
+                node = np.take(self._children, node * 2 + (x > np.take(threshold, node)))
+            outputs[start:start + len(row_offset)] = np.take(value, node)
+        return outputs
+
+    def predict_scaled(self, X_scaled):
+        """对已标准化的特征矩阵进行预测"""
+        X_scaled = np.atleast_2d(np.asarray(X_scaled, dtype=np.float64))
+        if self.kind == 'linear':
+            return X_scaled @ self.arrays['coef'] + self.arrays['intercept'][0]
+        outputs = self._tree_outputs(X_scaled)
+        if self.kind == 'forest':
+            return outputs.mean(axis=1)
+        return float(self.arrays['init']) + float(self.arrays['learning_rate']) * outputs.sum(axis=1)
+
+    def predict(self, X_raw):
+        """对原始特征矩阵进行预测（先用模型内保存的标准化参数转换）"""
+        X_raw = np.atleast_2d(np.asarray(X_raw, dtype=np.float64))
+        return self.predict_scaled((X_raw - self.mean) / self.scale)
@@ -0,0 +1,146 @@
+"""
+版本化特征仓库
+
+训练、评估、回测与在线更新共用同一份特征矩阵和标准化参数：
+- 特征矩阵、目标值、日期以 .npy 格式落盘，读取时内存映射
+- 标准化参数只在训练集上拟合一次，与特征矩阵一同保存在 meta.json
+- 版本号由内容哈希生成，manifest.json 记录版本列表与最新版本
+"""
+
+import os
+import json
+import math
+import shutil
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+
+class FeatureStore:
+    """
+    版本化特征仓库
+    - 特征矩阵、目标值、日期以 .npy 格式落盘，读取时内存映射（mmap_mode='r'）
+    - 标准化参数只在训练集上拟合一次，与特征矩阵一同保存
+    - 版本号由内容哈希生成，manifest.json 记录版本列表与最新版本
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, store_dir=None, keep_versions=5):
+        if store_dir is None:
+            store_dir = os.path.join(os.path.dirname(__file__), 'data', 'feature_store')
+        self.store_dir = store_dir
+        self.keep_versions = keep_versions
+
+    def _manifest_path(self):
+        return os.path.join(self.store_dir, 'manifest.json')
+
+    def _read_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {'format_version': self.FORMAT_VERSION, 'latest': None, 'versions': []}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def write(self, df, feature_columns, target_column='index_value', test_size=0.2):
+        """写入特征矩阵与标准化参数，返回版本号（内容未变时复用已有版本）"""
+        df_model = df[feature_columns + [target_column]].bfill().ffill()
+        X = np.ascontiguousarray(df_model[feature_columns].values, dtype=np.float64)
+        y = np.ascontiguousarray(df_model[target_column].values, dtype=np.float64)
+        dates = pd.to_datetime(df['date']).values.astype('datetime64[D]')
+
+        # 与 train_test_split(shuffle=False) 的划分方式一致
+        n_train = len(X) - int(math.ceil(len(X) * test_size))
+
+        # 标准化参数只在训练集上拟合（与StandardScaler一致：总体标准差，零方差按1处理）
+        mean = X[:n_train].mean(axis=0)
+        scale = X[:n_train].std(axis=0)
+        scale[scale == 0] = 1.0
+        X_scaled = (X - mean) / scale
+
+        digest = hashlib.sha1()
+        digest.update(json.dumps([feature_columns, target_column, n_train]).encode('utf-8'))
+        digest.update(X.tobytes())
+        digest.update(y.tobytes())
+        version = digest.hexdigest()[:12]
+
+        manifest = self._read_manifest()
+        version_dir = os.path.join(self.store_dir, version)
+        if not os.path.exists(version_dir):
+            # 先写临时目录再重命名，避免读到写了一半的版本
+            tmp_dir = version_dir + '.tmp'
+            os.makedirs(tmp_dir, exist_ok=True)
+            np.save(os.path.join(tmp_dir, 'features.npy'), X)
+            np.save(os.path.join(tmp_dir, 'features_scaled.npy'), X_scaled)
+            np.save(os.path.join(tmp_dir, 'target.npy'), y)
+            np.save(os.path.join(tmp_dir, 'dates.npy'), dates)
+            meta = {
+                'format_version': self.FORMAT_VERSION,
+                'version': version,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'feature_columns': list(feature_columns),
+                'target_column': target_column,
+                'n_samples': int(len(X)),
+                'n_train': int(n_train),
+                'scaler': {'mean': mean.tolist(), 'scale': scale.tolist()},
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_dir, version_dir)
+
+        versions = [v for v in manifest['versions'] if v != version] + [version]
+        for stale in versions[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self.store_dir, stale), ignore_errors=True)
+        manifest['versions'] = versions[-self.keep_versions:]
+        manifest['latest'] = version
+        self._write_manifest(manifest)
+
+        return version
+
+    def load(self, version=None):
+        """以内存映射方式读取某个版本（默认最新版本）的特征数据"""
+        if version is None:
+            version = self._read_manifest()['latest']
+            if version is None:
+                raise FileNotFoundError(f"特征仓库为空: {self.store_dir}")
+        version_dir = os.path.join(self.store_dir, version)
+        with open(os.path.join(version_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        return {
+            'version': version,
+            'feature_columns': meta['feature_columns'],
+            'target_column': meta['target_column'],
+            'n_train': meta['n_train'],
+            'mean': np.asarray(meta['scaler']['mean']),
+            'scale': np.asarray(meta['scaler']['scale']),
+            'X': np.load(os.path.join(version_dir, 'features_scaled.npy'), mmap_mode='r'),
+            'X_raw': np.load(os.path.join(version_dir, 'features.npy'), mmap_mode='r'),
+            'y': np.load(os.path.join(version_dir, 'target.npy'), mmap_mode='r'),
+            'dates': np.load(os.path.join(version_dir, 'dates.npy'), mmap_mode='r'),
+        }
+
+    @staticmethod
+    def transform(features, X_raw):
+        """使用仓库中保存的标准化参数转换新的原始特征（推理路径）"""
+        return (np.asarray(X_raw, dtype=np.float64) - features['mean']) / features['scale']
+
+    @staticmethod
+    def build_scaler(features):
+        """由仓库参数构造等价的StandardScaler，保持模型文件格式兼容"""
+        scaler = StandardScaler()
+        scaler.mean_ = np.array(features['mean'])
+        scaler.scale_ = np.array(features['scale'])
+        scaler.var_ = scaler.scale_ ** 2
+        scaler.n_features_in_ = len(features['feature_columns'])
+        scaler.n_samples_seen_ = features['n_train']
+        return scaler
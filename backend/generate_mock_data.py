@@ -9,10 +9,14 @@
 """
 
 import json
+import copy
 import random
 from datetime import datetime, timedelta
 import os
-import math
+import io
+import gzip
+import time
+import hashlib
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -26,17 +30,27 @@ matplotlib.use('Agg')  # 使用非交互式后端
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pyecharts import options as opts
-from pyecharts.charts import Line, Bar, Pie, Scatter, HeatMap, Kline
+from pyecharts.charts import Line, Bar, Pie, Scatter, HeatMap, Kline, Timeline
 from pyecharts.commons.utils import JsCode
 
 # 任务5：机器学习库
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LinearRegression, SGDRegressor
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import joblib
 
+# 紧凑模型导出与NumPy推理（推理端只依赖NumPy）
+from compact_predictor import flatten_model, save_compact_model, CompactPricePredictor
+
+# 二进制日期/产品索引（查询端 price_index.PriceIndex 只依赖NumPy）
+from price_index import write_price_index
+
+# 特征仓库、后台写入器、阶段调度（各自独立模块）
+from feature_store import FeatureStore
+from background_writer import BackgroundWriter
+from stage_scheduler import SharedFrame, StageScheduler, StageWriteError
+
 # 设置中文显示
 # 尝试多个中文字体，按优先级排列
 try:
@@ -71,8 +85,551 @@ except Exception as e:
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
 sns.set_style("whitegrid")
 
+
+# ============================================================================
+# 异常与事件检测：滚动z分数 / MAD稳健分数 / 均值漂移变点分数
+# ============================================================================
+
+class AnomalyDetector:
+    """
+    价格序列异常检测
+    - 对每个序列的日收益率，相对此前 window 天的收益率计算三种分数：
+      z分数、MAD稳健分数、最近 cp_span 天均值漂移的变点分数
+    - detect() 对整段历史向量化计算，按行分块：每块行数 = chunk_elements // (序列数 × window)，
+      临时内存只由 chunk_elements 决定，与天数、序列数无关
+    - update() 为流式模式，每个序列只保留最近 window 天的收益率（O(window) 状态）
+    """
+
+    METHODS = ('zscore', 'mad', 'changepoint')
+
+    def __init__(self, window=30, z_threshold=3.0, mad_threshold=3.5, cp_threshold=3.0,
+                 cp_span=3, chunk_elements=4_000_000):
+        self.window = window
+        self.thresholds = {'zscore': z_threshold, 'mad': mad_threshold, 'changepoint': cp_threshold}
+        self.cp_span = cp_span
+        self.chunk_elements = chunk_elements
+        self._buffer = None
+
+    def _score(self, current, history, recent_mean):
+        """
+        计算三种分数（history 最后一维为窗口）
+        - current: 当天收益率；recent_mean: 包含当天在内最近 cp_span 天的平均收益率
+        """
+        mean = history.mean(axis=-1)
+        std = history.std(axis=-1)
+
+        # MAD 在一份工作副本上原地计算（中位数用 overwrite_input 原地分区），不再产生额外的整块临时数组
+        work = np.array(history, dtype=np.float64)
+        median = np.median(work, axis=-1, overwrite_input=True)
+        np.subtract(work, median[..., None], out=work)
+        np.abs(work, out=work)
+        mad = np.median(work, axis=-1, overwrite_input=True) * 1.4826
+        del work
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscore = np.abs(current - mean) / std
+            mad_score = np.abs(current - median) / mad
+            changepoint = np.abs(recent_mean - mean) / (std / np.sqrt(self.cp_span))
+
+        return {
+            'zscore': np.nan_to_num(zscore, nan=0.0, posinf=0.0),
+            'mad': np.nan_to_num(mad_score, nan=0.0, posinf=0.0),
+            'changepoint': np.nan_to_num(changepoint, nan=0.0, posinf=0.0),
+        }
+
+    def _flags(self, scores):
+        return {method: scores[method] > self.thresholds[method] for method in self.METHODS}
+
+    def detect(self, values):
+        """
+        批量检测：values 为 (天数, 序列数) 的价格矩阵
+        返回 (scores, flags)，均为 {方法: (天数, 序列数) 数组}，前 window+1 天无足够历史，分数为0
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n_rows, n_series = values.shape
+        scores = {method: np.zeros((n_rows, n_series)) for method in self.METHODS}
+
+        returns = values[1:] / values[:-1] - 1
+        if len(returns) <= self.window:
+            return scores, self._flags(scores)
+
+        # 最近 cp_span 天平均收益率
+        recent_mean = np.full_like(returns, np.nan)
+        recent_mean[self.cp_span - 1:] = np.lib.stride_tricks.sliding_window_view(
+            returns, self.cp_span, axis=0
+        ).mean(axis=-1)
+
+        # 第 t 个收益率的历史窗口为 returns[t-window:t]，窗口视图不复制数据
+        windows = np.lib.stride_tricks.sliding_window_view(returns, self.window, axis=0)
+        chunk_rows = max(1, self.chunk_elements // (n_series * self.window))
+        for start in range(self.window, len(returns), chunk_rows):
+            stop = min(start + chunk_rows, len(returns))
+            chunk_scores = self._score(
+                returns[start:stop],
+                windows[start - self.window:stop - self.window],
+                recent_mean[start:stop]
+            )
+            for method in self.METHODS:
+                scores[method][start + 1:stop + 1] = chunk_scores[method]
+
+        return scores, self._flags(scores)
+
+    def reset(self):
+        self._buffer = None
+
+    def update(self, values):
+        """
+        流式检测：追加一天的价格（长度为序列数的一维数组）
+        返回当天的 (scores, flags)，均为 {方法: (序列数,) 数组}
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self._buffer is None:
+            self._buffer = {
+                'returns': np.zeros((len(values), self.window)),
+                'count': 0,
+                'pos': 0,
+                'last': values,
+            }
+            scores = {method: np.zeros(len(values)) for method in self.METHODS}
+            return scores, self._flags(scores)
+
+        state = self._buffer
+        current = values / state['last'] - 1
+        state['last'] = values
+
+        if state['count'] >= self.window:
+            # 最近 cp_span-1 天的收益率在环形缓冲区中位于 pos 之前
+            recent_idx = (state['pos'] - np.arange(1, self.cp_span)) % self.window
+            recent_mean = (current + state['returns'][:, recent_idx].sum(axis=1)) / self.cp_span
+            scores = self._score(current, state['returns'], recent_mean)
+        else:
+            scores = {method: np.zeros(len(values)) for method in self.METHODS}
+
+        state['returns'][:, state['pos']] = current
+        state['pos'] = (state['pos'] + 1) % self.window
+        state['count'] += 1
+
+        return scores, self._flags(scores)
+
+    @staticmethod
+    def evaluate(day_flags, event_mask, tolerance=1):
+        """
+        以生成器写入的事件标签为真值计算精确率与召回率
+        - 检测日与事件日相差不超过 tolerance 天即视为命中
+          （事件影响当天的指数涨跌，在按日期排序后的收益率中可能体现在相邻一天）
+        """
+        day_flags = np.asarray(day_flags, dtype=bool)
+        event_mask = np.asarray(event_mask, dtype=bool)
+
+        def dilate(mask):
+            out = mask.copy()
+            for shift in range(1, tolerance + 1):
+                out[shift:] |= mask[:-shift]
+                out[:-shift] |= mask[shift:]
+            return out
+
+        true_detections = day_flags & dilate(event_mask)
+        hit_events = event_mask & dilate(day_flags)
+
+        n_flagged = int(day_flags.sum())
+        n_events = int(event_mask.sum())
+        return {
+            'flagged_days': n_flagged,
+            'event_days': n_events,
+            'precision': float(true_detections.sum() / n_flagged) if n_flagged else 0.0,
+            'recall': float(hit_events.sum() / n_events) if n_events else 0.0,
+        }
+
+
+# ============================================================================
+# 商品目录：支持上千个SKU的品类相关因子模型
+# ============================================================================
+
+class ProductCatalog:
+    """
+    商品目录与相关因子模型
+    - 从CSV/JSON文件加载任意数量的SKU（key, name, category, price, volatility）
+    - 品类因子相关矩阵为“公共市场因子 + 品类独立项”的低秩结构，Cholesky分解后生成相关的品类因子
+    - SKU日波动 = 品类因子 × 载荷 + 独立噪声；同品类相关系数为 within_category_corr，
+      跨品类为 within_category_corr × cross_category_corr
+    - 每天对全部SKU一次性向量化抽样，成本与SKU数量成线性
+    """
+
+    UNIT = '元/公斤'
+
+    def __init__(self, keys, names, categories, prices, volatilities,
+                 within_category_corr=0.6, cross_category_corr=0.3):
+        self.keys = list(keys)
+        self.names = list(names)
+        self.categories = np.asarray(categories)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.volatilities = np.asarray(volatilities, dtype=np.float64)
+        self.within_category_corr = within_category_corr
+
+        self.category_names, self.category_index = np.unique(self.categories, return_inverse=True)
+        n_categories = len(self.category_names)
+        category_corr = np.full((n_categories, n_categories), cross_category_corr)
+        np.fill_diagonal(category_corr, 1.0)
+        self.category_cholesky = np.linalg.cholesky(category_corr)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """从CSV或JSON（记录列表）加载商品目录"""
+        if path.lower().endswith('.json'):
+            catalog = pd.read_json(path)
+        else:
+            catalog = pd.read_csv(path)
+        if 'volatility' not in catalog.columns:
+            catalog['volatility'] = 0.1
+        catalog['volatility'] = catalog['volatility'].fillna(0.1)
+        return cls(
+            catalog['key'].astype(str), catalog['name'].astype(str), catalog['category'].astype(str),
+            catalog['price'], catalog['volatility'], **kwargs
+        )
+
+    @classmethod
+    def synthetic(cls, n_skus=2000, n_categories=20, seed=42, **kwargs):
+        """生成用于压测的合成商品目录"""
+        rng = np.random.default_rng(seed)
+        categories = [f'category_{i:02d}' for i in rng.integers(0, n_categories, n_skus)]
+        return cls(
+            [f'sku_{i:05d}' for i in range(n_skus)],
+            [f'商品{i:05d}' for i in range(n_skus)],
+            categories,
+            np.round(rng.lognormal(mean=2.5, sigma=0.8, size=n_skus), 2),
+            np.round(rng.uniform(0.04, 0.16, size=n_skus), 3),
+            **kwargs
+        )
+
+    def save(self, path):
+        """保存为CSV，可再用 from_file 加载"""
+        pd.DataFrame({
+            'key': self.keys, 'name': self.names, 'category': self.categories,
+            'price': self.prices, 'volatility': self.volatilities
+        }).to_csv(path, index=False, encoding='utf-8')
+        return path
+
+    def __len__(self):
+        return len(self.keys)
+
+    def as_product_dict(self):
+        """转为与 product_base_prices 相同结构的字典"""
+        return {
+            key: {'name': name, 'price': float(price), 'volatility': float(vol), 'category': str(category)}
+            for key, name, price, vol, category in zip(
+                self.keys, self.names, self.prices, self.volatilities, self.categories
+            )
+        }
+
+    def draw_shocks(self, rng):
+        """
+        抽取一天全部SKU的相关波动（均值0）
+        - 标准差为 volatility/√3，与原 uniform(-volatility, volatility) 保持一致
+        """
+        category_factors = self.category_cholesky @ rng.standard_normal(len(self.category_names))
+        idiosyncratic = rng.standard_normal(len(self.keys))
+        w = self.within_category_corr
+        unit_shocks = np.sqrt(w) * category_factors[self.category_index] + np.sqrt(1 - w) * idiosyncratic
+        return unit_shocks * self.volatilities / np.sqrt(3)
+
+
+# ============================================================================
+# 增量相关矩阵：产品价格相关性随时间演变
+# ============================================================================
+
+class RollingCorrelation:
+    """
+    增量滚动 / 扩展相关矩阵
+    - 维护窗口内样本数、各序列之和、两两交叉乘积之和，每新增一天 O(序列数²) 更新，无需重算整个窗口
+    - window=None 为扩展窗口（从起点累计到当天）
+    - min_periods 默认：滚动窗口为窗口长度（窗口未满时为 NaN，与 pandas rolling 一致），扩展窗口为 2
+    - 数据先减去首行做平移，减少大数相减的精度损失；滚动窗口每 refresh_every 步用窗口缓冲重算累计量
+    """
+
+    def __init__(self, n_series, window=None, min_periods=None, refresh_every=1000):
+        self.window = window
+        if min_periods is None:
+            min_periods = window if window else 2
+        self.min_periods = min_periods
+        self.refresh_every = refresh_every
+
+        self._shift = None
+        self._count = 0
+        self._steps = 0
+        self._sum = np.zeros(n_series)
+        self._cross = np.zeros((n_series, n_series))
+        self._buffer = np.empty((window, n_series)) if window else None
+        self._pos = 0
+
+    def update(self, row):
+        """追加一天的数据，返回当前窗口的相关矩阵"""
+        row = np.asarray(row, dtype=np.float64)
+        if self._shift is None:
+            self._shift = row.copy()
+        x = row - self._shift
+
+        if self.window:
+            if self._count == self.window:
+                old = self._buffer[self._pos]
+                self._sum -= old
+                self._cross -= np.outer(old, old)
+                self._count -= 1
+            self._buffer[self._pos] = x
+            self._pos = (self._pos + 1) % self.window
+
+        self._sum += x
+        self._cross += np.outer(x, x)
+        self._count += 1
+        self._steps += 1
+
+        if self.window and self.refresh_every and self._steps % self.refresh_every == 0:
+            # 窗口未满时有效数据在缓冲区前 count 行，已满时为整个缓冲区（顺序不影响求和）
+            valid = self._buffer[:self._count]
+            self._sum = valid.sum(axis=0)
+            self._cross = valid.T @ valid
+
+        return self.correlation()
+
+    def correlation(self):
+        n_series = len(self._sum)
+        if self._count < self.min_periods:
+            return np.full((n_series, n_series), np.nan)
+
+        cov = self._cross - np.outer(self._sum, self._sum) / self._count
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        return np.clip(corr, -1.0, 1.0)
+
+    @classmethod
+    def compute(cls, values, window=None, out=None, **kwargs):
+        """
+        对 (天数, 序列数) 矩阵逐日增量计算，返回 (天数, 序列数, 序列数) 的 float32 数组
+        - out 可传入预分配数组（如 np.lib.format.open_memmap 创建的内存映射文件）
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n_rows, n_series = values.shape
+        if out is None:
+            out = np.empty((n_rows, n_series, n_series), dtype=np.float32)
+
+        engine = cls(n_series, window=window, **kwargs)
+        for t in range(n_rows):
+            out[t] = engine.update(values[t])
+        return out
+
+
+# ============================================================================
+# 图表数据包：pyecharts页面共享的外部压缩二进制数据
+# ============================================================================
+
+class ChartPayload:
+    """
+    图表外部数据包（gzip压缩的二进制文件）
+    - 结构：uint32 头部长度 + JSON头部 + 按4字节对齐的类型化数组（小端）
+    - 日期保存为起始日序号 + int16 逐日差分，数值序列保存为 float32
+    - 同一数据集的多个HTML图表 fetch 同一个数据包，页面中不再内联数据
+    """
+
+    # 页面端加载器：fetch + DecompressionStream 解压，按头部描述构造TypedArray
+    LOADER_JS = """
+        function loadAgriChartPayload(url) {
+            window.__agriChartPayloads = window.__agriChartPayloads || {};
+            if (!window.__agriChartPayloads[url]) {
+                window.__agriChartPayloads[url] = fetch(url).then(function (resp) {
+                    var stream = resp.body.pipeThrough(new DecompressionStream('gzip'));
+                    return new Response(stream).arrayBuffer();
+                }).then(function (buffer) {
+                    var headerLength = new DataView(buffer).getUint32(0, true);
+                    var header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+                    var dataStart = Math.ceil((4 + headerLength) / 4) * 4;
+                    var types = {float32: Float32Array, int32: Int32Array, int16: Int16Array};
+                    var arrays = {};
+                    Object.keys(header.arrays).forEach(function (name) {
+                        var spec = header.arrays[name];
+                        arrays[name] = new types[spec.dtype](buffer, dataStart + spec.offset, spec.length);
+                    });
+                    var day = header.date_start, dates = [];
+                    arrays.date_delta.forEach(function (delta) {
+                        day += delta;
+                        dates.push(new Date(day * 86400000).toISOString().slice(0, 10));
+                    });
+                    return {dates: dates, arrays: arrays};
+                });
+            }
+            return window.__agriChartPayloads[url];
+        }
+        function agriRound(values) {
+            return Array.from(values, function (v) { return Math.round(v * 100) / 100; });
+        }
+    """
+
+    @staticmethod
+    def _data_start(header_length):
+        return (4 + header_length + 3) // 4 * 4
+
+    @classmethod
+    def encode(cls, dates, arrays):
+        """把日期和数值数组编码为压缩数据包（bytes）"""
+        day_numbers = np.asarray(pd.to_datetime(dates).values.astype('datetime64[D]').astype(np.int64))
+        date_delta = np.diff(day_numbers, prepend=day_numbers[0]).astype(np.int16)
+
+        blobs = {'date_delta': date_delta}
+        for name, values in arrays.items():
+            values = np.asarray(values)
+            blobs[name] = values.astype(np.int32 if values.dtype.kind in 'iu' else np.float32)
+
+        # 数组偏移相对于数据区起点（头部之后按4字节对齐），每个数组也按4字节对齐
+        specs, offset = {}, 0
+        for name, blob in blobs.items():
+            offset += -offset % 4
+            specs[name] = {'dtype': blob.dtype.name, 'offset': offset, 'length': int(len(blob))}
+            offset += blob.nbytes
+
+        header_bytes = json.dumps({'date_start': int(day_numbers[0]), 'arrays': specs}).encode('utf-8')
+        data_start = cls._data_start(len(header_bytes))
+        buffer = bytearray(data_start + offset)
+        buffer[0:4] = np.array(len(header_bytes), dtype='<u4').tobytes()
+        buffer[4:4 + len(header_bytes)] = header_bytes
+        for name, blob in blobs.items():
+            start = data_start + specs[name]['offset']
+            buffer[start:start + blob.nbytes] = blob.astype(blob.dtype.newbyteorder('<')).tobytes()
+
+        return gzip.compress(bytes(buffer), compresslevel=9)
+
+    @classmethod
+    def decode(cls, payload):
+        """解码数据包（供Python端工具和校验使用）"""
+        buffer = gzip.decompress(payload)
+        header_length = int(np.frombuffer(buffer[:4], dtype='<u4')[0])
+        header = json.loads(buffer[4:4 + header_length].decode('utf-8'))
+        data_start = cls._data_start(header_length)
+        arrays = {
+            name: np.frombuffer(buffer, dtype=np.dtype(spec['dtype']).newbyteorder('<'),
+                                count=spec['length'], offset=data_start + spec['offset'])
+            for name, spec in header['arrays'].items()
+        }
+        day_numbers = header['date_start'] + np.cumsum(arrays.pop('date_delta').astype(np.int64))
+        return day_numbers.astype('datetime64[D]'), arrays
+
+    @classmethod
+    def bind(cls, chart, payload_url, option_js):
+        """为图表添加加载数据包后 setOption 的脚本；option_js 中用 p.dates / p.arrays 引用数据"""
+        chart.add_js_funcs(
+            cls.LOADER_JS,
+            f"loadAgriChartPayload('{payload_url}').then(function (p) {{ "
+            f"chart_{chart.chart_id}.setOption({option_js}); }});"
+        )
+        return chart
+
+
+# ============================================================================
+# 滚动起点回测：全部起点 × 预测步长一次批量预测，指标按步长向量化计算
+# ============================================================================
+
+class RollingOriginBacktest:
+    """
+    滚动起点回测（向量化）
+    - 起点 t 只使用截至 t 的信息：日历特征取目标日的值（事先已知），其余特征（移动平均、波动率）冻结为起点当天的值
+    - 所有起点 × 步长的特征拼成一个批量矩阵，每个模型只调用一次 predict，得到 (起点数, 步长数) 的预测矩阵
+    - 各步长的 MAE / RMSE / MAPE / R² / 偏差 沿起点维度一次算出
+    - 附带"持平基线"（预测值 = 起点当天实际值）作为对照
+    - 指标按目标日分为样本外（测试集）与样本内（训练集，存在信息泄漏，仅供参考）两组
+    """
+
+    SEGMENTS = {
+        'out_of_sample': '样本外：目标日在测试集，模型训练时未见过',
+        'in_sample': '样本内：目标日在训练集，模型已拟合过这些数据，仅供参考',
+    }
+
+    METRICS = ('mae', 'rmse', 'mape', 'r2', 'bias')
+    KNOWN_COLUMNS = ('month', 'day', 'weekday', 'quarter', 'day_of_year')
+    BASELINE = '持平基线'
+
+    def __init__(self, horizon=14, step=1, min_history=30, known_columns=KNOWN_COLUMNS):
+        self.horizon = horizon
+        self.step = step
+        self.min_history = min_history
+        self.known_columns = tuple(known_columns)
+
+    def build_batch(self, X_raw, feature_columns, origins):
+        """返回 (起点数, 步长数, 特征数) 的原始特征张量、目标行号与有效掩码"""
+        X_raw = np.asarray(X_raw, dtype=np.float64)
+        horizons = np.arange(1, self.horizon + 1)
+        target = origins[:, None] + horizons[None, :]
+        valid = target < len(X_raw)
+        target = np.minimum(target, len(X_raw) - 1)
+
+        batch = X_raw[target]
+        frozen = [i for i, col in enumerate(feature_columns) if col not in self.known_columns]
+        batch[:, :, frozen] = X_raw[origins][:, None, frozen]
+        return batch, target, valid
+
+    @classmethod
+    def metrics(cls, predictions, actual, valid):
+        """
+        predictions: (模型数, 起点数, 步长数)；actual / valid: (起点数, 步长数)
+        返回 {指标: (模型数, 步长数)}，无有效样本的步长为 NaN
+        """
+        actual = np.where(valid, actual, np.nan)
+        errors = predictions - actual
+        with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            squared = np.nanmean(errors ** 2, axis=1)
+            total = np.nansum((actual - np.nanmean(actual, axis=0)) ** 2, axis=0)
+            return {
+                'mae': np.nanmean(np.abs(errors), axis=1),
+                'rmse': np.sqrt(squared),
+                'mape': np.nanmean(np.abs(errors / actual), axis=1) * 100,
+                'r2': 1 - np.nansum(errors ** 2, axis=1) / np.where(total > 0, total, np.nan),
+                'bias': np.nanmean(errors, axis=1),
+            }
+
+    def run(self, models, features):
+        """
+        models: {模型名: 已训练的sklearn模型}；features: FeatureStore.load() 的返回值
+        返回起点日期、实际值矩阵、(模型数, 起点数, 步长数) 预测张量以及分组指标
+        """
+        X_raw = np.asarray(features['X_raw'], dtype=np.float64)
+        y = np.asarray(features['y'], dtype=np.float64)
+        n_rows = len(y)
+
+        origins = np.arange(self.min_history - 1, n_rows - 1, self.step)
+        batch, target, valid = self.build_batch(X_raw, features['feature_columns'], origins)
+        flat = FeatureStore.transform(features, batch.reshape(-1, batch.shape[-1]))
+
+        names = list(models) + [self.BASELINE]
+        predictions = np.empty((len(names), len(origins), self.horizon))
+        for i, model in enumerate(models.values()):
+            predictions[i] = np.asarray(model.predict(flat)).reshape(len(origins), self.horizon)
+        predictions[-1] = y[origins][:, None]
+
+        actual = y[target]
+        # 按目标日划分：样本外为目标日在测试集（n_train 及之后，模型训练时未见过），
+        # 样本内为目标日在训练集，模型已拟合过这些数据，只能作为参考
+        in_test = target >= features['n_train']
+        segments = {'out_of_sample': valid & in_test, 'in_sample': valid & ~in_test}
+
+        return {
+            'models': names,
+            'horizons': np.arange(1, self.horizon + 1),
+            'origins': origins,
+            'origin_dates': np.asarray(features['dates'])[origins],
+            'actual': actual,
+            'valid': valid,
+            'predictions': predictions,
+            'counts': {segment: mask.sum(axis=0) for segment, mask in segments.items()},
+            'metrics': {segment: self.metrics(predictions, actual, mask) for segment, mask in segments.items()},
+        }
+
+
 class AgriPriceDataGenerator:
-    def __init__(self):
+    # 预处理之后的阶段不再使用的文本列（原文仍保存在JSON数据中）
+    TEXT_COLUMNS = ('title', 'url', 'products')
+
+    # 紧凑模型与sklearn预测的最大允许偏差，超过则不导出紧凑模型
+    COMPACT_MODEL_TOLERANCE = 1e-6
+
+    def __init__(self, writer=None, catalog=None, seed=None):
         # 基准价格指数（参考真实数据）
         self.base_index = 120.0
         self.basket_base_index = 121.5
@@ -90,7 +647,79 @@ class AgriPriceDataGenerator:
             'banana': {'name': '香蕉', 'price': 6.2, 'volatility': 0.12},
         }
         
+        # 可选的商品目录（ProductCatalog）：设置后按品类因子模型向量化生成全部SKU价格
+        self.catalog = catalog
+
+        # 随机数均来自实例自己的生成器：指定 seed 时指数、事件、URL 和SKU价格都可复现
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        if catalog is not None:
+            self.product_base_prices = catalog.as_product_dict()
+        
         self.data = []
+
+        # 最近一次在线模型更新后的状态（写盘可能仍在后台进行）
+        self.online_state = None
+
+        # 可选的后台写入器（None 时所有文件同步写入）
+        self.writer = writer
+
+    def __getstate__(self):
+        # 传给阶段子进程时不携带线程池和原始记录（阶段只读取共享的DataFrame）
+        state = self.__dict__.copy()
+        state['writer'] = None
+        state['data'] = []
+        return state
+
+    def run_stage(self, method_name, *args, **kwargs):
+        """
+        在阶段子进程中调用本类的方法
+        - 子进程内单独创建后台写入器，方法返回前等待其写盘完成
+        - 有文件写入失败时抛出 StageWriteError，调度器据此把阶段标记为失败
+        - 只把结果的标量摘要（如各模型指标）回传父进程，模型对象和预测数组不经pickle传回
+        """
+        self.writer = BackgroundWriter()
+        error = None
+        try:
+            result = getattr(self, method_name)(*args, **kwargs)
+        except Exception as e:
+            error = e
+        write_errors = self.writer.close()
+        self.writer = None
+
+        if write_errors:
+            raise StageWriteError([description for description, _ in write_errors], cause=error)
+        if error is not None:
+            raise error
+        return self._stage_summary(result)
+
+    @staticmethod
+    def _stage_summary(result):
+        """保留结果字典中的标量（以及下一层字典中的标量），其余丢弃；无可回传内容时返回 None"""
+        if not isinstance(result, dict):
+            return None
+        scalar = (int, float, str, bool)
+        summary = {}
+        for key, value in result.items():
+            if isinstance(value, dict):
+                value = {k: v for k, v in value.items() if isinstance(v, scalar)}
+                if value:
+                    summary[key] = value
+            elif isinstance(value, scalar):
+                summary[key] = value
+        return summary or None
+
+    def _save_artifact(self, description, func, *args, **kwargs):
+        """保存产出文件：配置了后台写入器时异步提交，否则同步执行"""
+        if self.writer is not None:
+            return self.writer.submit(description, func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def _save_figure(self, description, fig, path, **savefig_kwargs):
+        """保存matplotlib图像：渲染在当前线程完成，写文件可交给后台"""
+        if self.writer is not None:
+            return self.writer.save_figure(description, fig, path, **savefig_kwargs)
+        return fig.savefig(path, **savefig_kwargs)
     
     def generate_seasonal_factor(self, date):
         """生成季节性因子"""
@@ -130,14 +759,50 @@ class AgriPriceDataGenerator:
     def generate_random_event(self, date):
         """生成随机事件影响"""
         # 5%概率发生异常事件
-        if random.random() < 0.05:
-            event_type = random.choice(['positive', 'negative'])
+        if self.random.random() < 0.05:
+            event_type = self.random.choice(['positive', 'negative'])
             if event_type == 'positive':
-                return random.uniform(-0.02, -0.005), "利好政策"
+                return self.random.uniform(-0.02, -0.005), "利好政策"
             else:
-                return random.uniform(0.005, 0.02), "不利天气"
+                return self.random.uniform(0.005, 0.02), "不利天气"
         return 0, None
     
+    def generate_product_prices(self, seasonal, trend, total_change):
+        """逐个生成内置产品价格（各产品独立波动）"""
+        products = {}
+        for key, info in self.product_base_prices.items():
+            base_price = info['price']
+            volatility = info['volatility']
+            
+            # 产品价格变化与总指数相关，但有自己的波动
+            product_change = total_change * 0.7 + self.random.uniform(-volatility, volatility) * 0.3
+            product_change = max(-0.05, min(0.05, product_change))  # 限制±5%
+            
+            product_price = base_price * seasonal * trend * (1 + product_change)
+            
+            products[key] = {
+                'name': info['name'],
+                'price': round(product_price, 2),
+                'change_percent': round(product_change * 100, 1),
+                'unit': '元/公斤'
+            }
+        
+        return products
+
+    def generate_catalog_prices(self, seasonal, trend, total_change):
+        """按商品目录的品类因子模型，一次性向量化生成全部SKU价格"""
+        catalog = self.catalog
+        product_change = np.clip(total_change * 0.7 + catalog.draw_shocks(self.rng) * 0.3, -0.05, 0.05)
+        product_price = catalog.prices * seasonal * trend * (1 + product_change)
+
+        return {
+            key: {'name': name, 'price': price, 'change_percent': change, 'unit': ProductCatalog.UNIT}
+            for key, name, price, change in zip(
+                catalog.keys, catalog.names,
+                np.round(product_price, 2).tolist(), np.round(product_change * 100, 1).tolist()
+            )
+        }
+    
     def generate_one_day_data(self, date, prev_index, days_passed, total_days):
         """生成一天的数据"""
         
@@ -148,7 +813,7 @@ class AgriPriceDataGenerator:
         event_change, event_desc = self.generate_random_event(date)
         
         # 随机波动
-        random_change = random.uniform(-0.01, 0.01)
+        random_change = self.random.uniform(-0.01, 0.01)
         
         # 计算总变化
         total_change = (seasonal - 1) * 0.3 + (weekly - 1) * 0.5 + (trend - 1) * 0.3 + event_change + random_change
@@ -168,26 +833,13 @@ class AgriPriceDataGenerator:
         basket_index = new_index * 1.012
         
         # 生成各类产品价格
-        products = {}
-        for key, info in self.product_base_prices.items():
-            base_price = info['price']
-            volatility = info['volatility']
-            
-            # 产品价格变化与总指数相关，但有自己的波动
-            product_change = total_change * 0.7 + random.uniform(-volatility, volatility) * 0.3
-            product_change = max(-0.05, min(0.05, product_change))  # 限制±5%
-            
-            product_price = base_price * seasonal * trend * (1 + product_change)
-            
-            products[key] = {
-                'name': info['name'],
-                'price': round(product_price, 2),
-                'change_percent': round(product_change * 100, 1),
-                'unit': '元/公斤'
-            }
+        if self.catalog is not None:
+            products = self.generate_catalog_prices(seasonal, trend, total_change)
+        else:
+            products = self.generate_product_prices(seasonal, trend, total_change)
         
         # 生成URL（模拟真实URL格式）
-        url = f"https://www.agri.cn/V20/ZX/nyyw/202{date.year-2020}/{date.month:02d}/t{date.year}{date.month:02d}{date.day:02d}_{random.randint(10000000, 99999999)}.htm"
+        url = f"https://www.agri.cn/V20/ZX/nyyw/202{date.year-2020}/{date.month:02d}/t{date.year}{date.month:02d}{date.day:02d}_{self.random.randint(10000000, 99999999)}.htm"
         
         return {
             'date': date.strftime('%Y-%m-%d'),
@@ -246,13 +898,13 @@ class AgriPriceDataGenerator:
                 'seasonal_variation': '包含季节性波动',
                 'trend': '年化增长约4%',
                 'events': '随机事件影响',
-                'products': '9类农产品价格'
+                'products': f'{len(self.product_base_prices)}类农产品价格'
             },
             'data': self.data
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        self._save_artifact('JSON数据', BackgroundWriter.write_text_file,
+                            filepath, json.dumps(output, ensure_ascii=False, indent=2))
         
         print(f"\n数据已保存到: {filepath}")
         return filepath
@@ -293,10 +945,19 @@ class AgriPriceDataGenerator:
         
         # 产品价格统计
         print(f"\n农产品价格范围:")
-        for key, info in self.product_base_prices.items():
-            prices = [d['products'][key]['price'] for d in self.data if key in d.get('products', {})]
-            if prices:
-                print(f"  {info['name']}: {min(prices):.2f} - {max(prices):.2f} 元/公斤")
+        if self.catalog is not None and len(self.catalog) > 20:
+            # 大型商品目录按品类汇总，避免逐个SKU输出
+            price_matrix = np.array([[d['products'][key]['price'] for key in self.catalog.keys] for d in self.data])
+            print(f"  共 {len(self.catalog)} 个SKU，{len(self.catalog.category_names)} 个品类")
+            for i, category in enumerate(self.catalog.category_names):
+                category_prices = price_matrix[:, self.catalog.category_index == i]
+                print(f"  {category}: {category_prices.shape[1]} 个SKU，"
+                      f"{category_prices.min():.2f} - {category_prices.max():.2f} 元/公斤")
+        else:
+            for key, info in self.product_base_prices.items():
+                prices = [d['products'][key]['price'] for d in self.data if key in d.get('products', {})]
+                if prices:
+                    print(f"  {info['name']}: {min(prices):.2f} - {max(prices):.2f} 元/公斤")
         
         print("="*60)
         
@@ -314,13 +975,14 @@ class AgriPriceDataGenerator:
     # 任务3：数据探索与预处理 (使用Pandas和NumPy)
     # ========================================================================
     
-    def analyze_and_preprocess_data(self):
+    def analyze_and_preprocess_data(self, memory_optimized=False):
         """
         任务3：使用Pandas和NumPy进行数据探索与预处理
         - 数据加载与探索
         - 数据清洗与处理
         - 特征工程
         - 数据标准化
+        - memory_optimized=True 时压缩数据类型并移除未使用的文本列
         """
         print("\n" + "="*80)
         print("【任务3】数据探索与预处理 (Pandas + NumPy)")
@@ -330,11 +992,16 @@ class AgriPriceDataGenerator:
         print("\n[步骤1] 使用Pandas加载数据...")
         df = pd.DataFrame(self.data)
         
-        # 展开products字段为独立列
-        for product_key in self.product_base_prices.keys():
-            df[f'{product_key}_price'] = df['products'].apply(
-                lambda x: x.get(product_key, {}).get('price', np.nan) if isinstance(x, dict) else np.nan
-            )
+        # 展开products字段为独立列（一次遍历生成全部产品价格列，SKU数量较多时避免逐列apply）
+        product_keys = list(self.product_base_prices.keys())
+        product_prices = pd.DataFrame(
+            [[x.get(key, {}).get('price', np.nan) for key in product_keys] if isinstance(x, dict)
+             else [np.nan] * len(product_keys) for x in df['products']],
+            columns=[f'{key}_price' for key in product_keys],
+            index=df.index,
+            dtype=np.float64
+        )
+        df = pd.concat([df, product_prices], axis=1)
         
         print(f"✓ 数据形状: {df.shape}")
         print(f"✓ 数据类型:\n{df.dtypes}")
@@ -397,30 +1064,88 @@ class AgriPriceDataGenerator:
         # 6. 相关性分析
         print("\n[步骤6] 产品价格相关性分析...")
         price_cols = [col for col in df.columns if col.endswith('_price')]
-        correlation_matrix = df[price_cols].corr()
+        correlation_matrix = self._correlation_matrix(df[price_cols])
         print(f"✓ 已计算 {len(price_cols)} 种产品间的相关性矩阵")
+
+        # 二进制索引的数值在内存优化（降为float32）之前取出，保持与JSON/CSV一致的float64精度
+        index_columns = ['index_value'] + price_cols
+        index_dates = df['date'].to_numpy(dtype='datetime64[D]')
+        index_values = df[index_columns].to_numpy(dtype=np.float64, copy=True)
+
+        # 7. 内存优化（可选）
+        if memory_optimized:
+            print("\n[步骤7] 内存优化...")
+            df = self.optimize_dataframe_memory(df)
         
-        # 7. 保存预处理后的数据
+        # 8. 保存预处理后的数据
         output_dir = os.path.join(os.path.dirname(__file__), 'data')
         processed_file = os.path.join(output_dir, 'processed_data.csv')
-        df.to_csv(processed_file, index=False, encoding='utf-8-sig')
+        self._save_artifact('预处理CSV', df.to_csv, processed_file, index=False, encoding='utf-8-sig')
         print(f"\n✓ 预处理后的数据已保存: {processed_file}")
+
+        # 9. 二进制日期/产品索引（按日期二分查找，按需读取，无需加载整个CSV/JSON）
+        index_file = os.path.join(output_dir, 'price_index.idx')
+        values_file = os.path.join(output_dir, 'price_values.bin')
+        self._save_artifact('价格二进制索引', write_price_index, index_file, values_file,
+                            index_dates, index_values, index_columns)
+        print(f"✓ 二进制价格索引已保存: {index_file}（{len(df)} 天 × {len(index_columns)} 列）")
         
         print("\n" + "="*80)
         print("【任务3完成】数据探索与预处理成功！")
         print("="*80)
         
         return df, correlation_matrix
+
+    @staticmethod
+    def _correlation_matrix(frame):
+        """相关系数矩阵：无缺失值时用 np.corrcoef（矩阵乘法），上千个SKU时远快于逐对计算"""
+        values = frame.to_numpy(dtype=np.float64)
+        if np.isnan(values).any():
+            return frame.corr()
+        return pd.DataFrame(np.corrcoef(values, rowvar=False), index=frame.columns, columns=frame.columns)
+
+    def optimize_dataframe_memory(self, df):
+        """
+        压缩DataFrame内存占用
+        - 日期拆分列降为 int8/int16，价格类浮点列降为 float32
+        - event、compare_base 转为 category
+        - title、url、products 后续阶段不再使用，从DataFrame中移除（原文仍保存在JSON数据中）
+        """
+        memory_before = df.memory_usage(deep=True).sum()
+
+        df = df.drop(columns=[col for col in self.TEXT_COLUMNS if col in df.columns])
+
+        int_dtypes = {
+            'year': np.int16, 'day_of_year': np.int16,
+            'month': np.int8, 'day': np.int8, 'weekday': np.int8, 'quarter': np.int8,
+        }
+        df = df.astype({col: dtype for col, dtype in int_dtypes.items() if col in df.columns})
+
+        float_cols = df.select_dtypes(include='float64').columns
+        df[float_cols] = df[float_cols].astype(np.float32)
+
+        for col in ['event', 'compare_base']:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+
+        memory_after = df.memory_usage(deep=True).sum()
+        print(f"✓ 内存占用(deep): {memory_before / 1024:.1f} KB → {memory_after / 1024:.1f} KB "
+              f"（压缩 {memory_before / memory_after:.1f} 倍）")
+        print(f"✓ 已移除文本列: title, url, products；价格列为float32，日期列为int8/int16")
+
+        return df
     
     # ========================================================================
     # 任务4：数据统计与可视化 (使用Matplotlib和Pyecharts)
     # ========================================================================
     
-    def visualize_data(self, df, correlation_matrix):
+    def visualize_data(self, df, correlation_matrix, external_payload=False):
         """
         任务4：使用Matplotlib和Pyecharts进行数据统计与可视化
         - Matplotlib生成静态图表
         - Pyecharts生成交互式图表
+        - external_payload=True 时图表数据写入共享的压缩二进制数据包，HTML页面通过fetch加载
+          （需通过HTTP服务访问页面，file:// 下浏览器禁止fetch）
         """
         print("\n" + "="*80)
         print("【任务4】数据统计与可视化 (Matplotlib + Pyecharts)")
@@ -505,7 +1230,7 @@ class AgriPriceDataGenerator:
         
         # Chart 7: Correlation Heatmap
         ax7 = plt.subplot(3, 3, 7)
-        price_cols_heatmap = [col for col in df.columns if col.endswith('_price')]
+        price_cols_heatmap = [col for col in df.columns if col.endswith('_price')][:10]  # 大型目录只展示前10个
         corr_data = df[price_cols_heatmap].corr()
         sns.heatmap(corr_data, annot=True, fmt='.2f', cmap='coolwarm', 
                    square=True, ax=ax7, cbar_kws={'shrink': 0.8})
@@ -541,34 +1266,58 @@ class AgriPriceDataGenerator:
         
         plt.tight_layout()
         matplotlib_output = os.path.join(output_dir, 'price_analysis_matplotlib.png')
-        plt.savefig(matplotlib_output, dpi=150, bbox_inches='tight')
-        plt.close()
+        self._save_figure('Matplotlib统计图', fig, matplotlib_output, dpi=150, bbox_inches='tight')
+        plt.close(fig)
         print(f"✓ Matplotlib图表已保存: {matplotlib_output}")
         
         # ==================== Pyecharts交互式图表 ====================
         print("\n[2] 使用Pyecharts生成交互式图表...")
+
+        monthly_stats = df.groupby('month').agg({
+            'index_value': 'mean',
+            'change': ['sum', 'count']
+        }).round(2)
+
+        up_count = len(df[df['change'] > 0])
+        down_count = len(df[df['change'] < 0])
+        flat_count = len(df[df['change'] == 0])
+
+        # 外部数据包模式：三个图表共享同一个数据包，HTML中的数据数组留空
+        inline = not external_payload
+        payload_name = 'price_chart_data.bin'
+        if external_payload:
+            payload_output = os.path.join(output_dir, payload_name)
+            payload = ChartPayload.encode(df['date'], {
+                'index_value': df['index_value'],
+                'ma_7': df['ma_7'],
+                'ma_30': df['ma_30'],
+                'monthly_mean': monthly_stats['index_value']['mean'],
+                'change_counts': np.array([up_count, down_count, flat_count]),
+            })
+            self._save_artifact('图表数据包', BackgroundWriter.write_bytes_file, payload_output, payload)
+            print(f"✓ 图表数据包已保存: {payload_output} ({len(payload) / 1024:.1f} KB)")
         
         # 图表1: 价格趋势交互式折线图
         line = (
             Line()
-            .add_xaxis(df['date'].dt.strftime('%Y-%m-%d').tolist())
+            .add_xaxis(df['date'].dt.strftime('%Y-%m-%d').tolist() if inline else [])
             .add_yaxis(
                 "价格指数",
-                df['index_value'].tolist(),
+                df['index_value'].tolist() if inline else [],
                 is_smooth=True,
                 linestyle_opts=opts.LineStyleOpts(width=2),
                 itemstyle_opts=opts.ItemStyleOpts(color='#5470C6')
             )
             .add_yaxis(
                 "7日均线",
-                df['ma_7'].tolist(),
+                df['ma_7'].tolist() if inline else [],
                 is_smooth=True,
                 linestyle_opts=opts.LineStyleOpts(width=2, type_='dashed'),
                 itemstyle_opts=opts.ItemStyleOpts(color='#EE6666')
             )
             .add_yaxis(
                 "30日均线",
-                df['ma_30'].tolist(),
+                df['ma_30'].tolist() if inline else [],
                 is_smooth=True,
                 linestyle_opts=opts.LineStyleOpts(width=2, type_='dashed'),
                 itemstyle_opts=opts.ItemStyleOpts(color='#91CC75')
@@ -581,20 +1330,22 @@ class AgriPriceDataGenerator:
                 datazoom_opts=[opts.DataZoomOpts(range_start=0, range_end=100)],
             )
         )
+        if external_payload:
+            ChartPayload.bind(line, payload_name, (
+                "{xAxis: [{data: p.dates}], series: ["
+                "{data: agriRound(p.arrays.index_value)}, "
+                "{data: agriRound(p.arrays.ma_7)}, "
+                "{data: agriRound(p.arrays.ma_30)}]}"
+            ))
         line_output = os.path.join(output_dir, 'price_trend_pyecharts.html')
-        line.render(line_output)
+        self._save_artifact('趋势图HTML', BackgroundWriter.write_text_file, line_output, line.render_embed())
         print(f"✓ 交互式趋势图已保存: {line_output}")
         
         # 图表2: 月度统计柱状图
-        monthly_stats = df.groupby('month').agg({
-            'index_value': 'mean',
-            'change': ['sum', 'count']
-        }).round(2)
-        
         bar = (
             Bar()
             .add_xaxis([f"{i}月" for i in range(1, 13)])
-            .add_yaxis("平均价格指数", monthly_stats['index_value']['mean'].tolist())
+            .add_yaxis("平均价格指数", monthly_stats['index_value']['mean'].tolist() if inline else [])
             .set_global_opts(
                 title_opts=opts.TitleOpts(title="月度价格统计"),
                 tooltip_opts=opts.TooltipOpts(trigger="axis"),
@@ -602,23 +1353,21 @@ class AgriPriceDataGenerator:
                 yaxis_opts=opts.AxisOpts(name="平均价格指数"),
             )
         )
+        if external_payload:
+            ChartPayload.bind(bar, payload_name, "{series: [{data: agriRound(p.arrays.monthly_mean)}]}")
         bar_output = os.path.join(output_dir, 'monthly_stats_pyecharts.html')
-        bar.render(bar_output)
+        self._save_artifact('月度统计HTML', BackgroundWriter.write_text_file, bar_output, bar.render_embed())
         print(f"✓ 交互式柱状图已保存: {bar_output}")
         
         # 图表3: 涨跌分布饼图
-        up_count = len(df[df['change'] > 0])
-        down_count = len(df[df['change'] < 0])
-        flat_count = len(df[df['change'] == 0])
-        
         pie = (
             Pie()
             .add(
                 "",
                 [
-                    ("上涨", up_count),
-                    ("下跌", down_count),
-                    ("持平", flat_count),
+                    ("上涨", up_count if inline else 0),
+                    ("下跌", down_count if inline else 0),
+                    ("持平", flat_count if inline else 0),
                 ],
                 radius=["40%", "70%"],
             )
@@ -628,8 +1377,15 @@ class AgriPriceDataGenerator:
             )
             .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {c}天 ({d}%)"))
         )
+        if external_payload:
+            ChartPayload.bind(pie, payload_name, (
+                "{series: [{data: ["
+                "{name: '上涨', value: p.arrays.change_counts[0]}, "
+                "{name: '下跌', value: p.arrays.change_counts[1]}, "
+                "{name: '持平', value: p.arrays.change_counts[2]}]}]}"
+            ))
         pie_output = os.path.join(output_dir, 'change_distribution_pyecharts.html')
-        pie.render(pie_output)
+        self._save_artifact('涨跌分布HTML', BackgroundWriter.write_text_file, pie_output, pie.render_embed())
         print(f"✓ 交互式饼图已保存: {pie_output}")
         
         print("\n" + "="*80)
@@ -659,31 +1415,31 @@ class AgriPriceDataGenerator:
         feature_columns = ['month', 'day', 'weekday', 'quarter', 'day_of_year', 
                           'ma_7', 'ma_30', 'volatility']
         
-        # 处理缺失值
-        df_model = df[feature_columns + ['index_value']].copy()
-        df_model = df_model.bfill().ffill()  # 向后填充，然后向前填充
-        
-        X = df_model[feature_columns].values
-        y = df_model['index_value'].values
-        
+        # 写入特征仓库（缺失值填充、训练集标准化参数拟合只在这里做一次）
+        feature_store = FeatureStore()
+        store_version = feature_store.write(df, feature_columns, test_size=0.2)
+        features = feature_store.load(store_version)
+
+        X = features['X']
+        y = features['y']
+        n_train = features['n_train']
+
+        print(f"✓ 特征仓库版本: {store_version}")
         print(f"✓ 特征数量: {X.shape[1]}")
         print(f"✓ 样本数量: {X.shape[0]}")
         print(f"✓ 特征列表: {feature_columns}")
-        
-        # 2. 数据集划分
+
+        # 2. 数据集划分（时间序列不打乱，切片为内存映射视图，不复制数据）
         print("\n[步骤2] 划分训练集和测试集...")
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, shuffle=False  # 时间序列不打乱
-        )
-        print(f"✓ 训练集大小: {X_train.shape[0]} 样本")
-        print(f"✓ 测试集大小: {X_test.shape[0]} 样本")
-        
-        # 3. 特征标准化
+        X_train_scaled, X_test_scaled = X[:n_train], X[n_train:]
+        y_train, y_test = y[:n_train], y[n_train:]
+        print(f"✓ 训练集大小: {X_train_scaled.shape[0]} 样本")
+        print(f"✓ 测试集大小: {X_test_scaled.shape[0]} 样本")
+
+        # 3. 特征标准化（直接使用仓库中保存的标准化参数）
         print("\n[步骤3] 特征标准化...")
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        print(f"✓ 特征已标准化（均值=0，标准差=1）")
+        scaler = FeatureStore.build_scaler(features)
+        print(f"✓ 特征已标准化（均值=0，标准差=1），参数来自特征仓库")
         
         # 4. 模型训练与评估
         print("\n[步骤4] 训练多个机器学习模型...")
@@ -763,10 +1519,11 @@ class AgriPriceDataGenerator:
         
         # 保存最佳模型
         best_model_path = os.path.join(models_dir, 'best_price_prediction_model.pkl')
-        joblib.dump({
+        self._save_artifact('最佳模型', joblib.dump, {
             'model': best_model[1],
             'scaler': best_model[2],
             'feature_columns': feature_columns,
+            'feature_store_version': store_version,
             'model_name': best_model[0],
             'performance': {
                 'r2': best_score,
@@ -775,10 +1532,27 @@ class AgriPriceDataGenerator:
             }
         }, best_model_path)
         print(f"✓ 最佳模型已保存: {best_model_path}")
+
+        # 导出紧凑模型（纯NumPy数组），并校验与sklearn预测结果一致
+        compact_arrays = flatten_model(best_model[1], best_model[2], feature_columns, best_model[0])
+        compact_diff = np.max(np.abs(
+            CompactPricePredictor(compact_arrays).predict_scaled(X_test_scaled)
+            - results[best_model[0]]['predictions']
+        ))
+        compact_model_path = os.path.join(models_dir, 'best_price_prediction_model.npz')
+        if compact_diff <= self.COMPACT_MODEL_TOLERANCE:
+            self._save_artifact('紧凑模型', save_compact_model, compact_model_path, compact_arrays)
+            print(f"✓ 紧凑模型已保存: {compact_model_path}（与sklearn预测最大偏差 {compact_diff:.2e}）")
+        else:
+            # 删除旧的紧凑模型，避免与新保存的最佳模型不一致
+            if os.path.exists(compact_model_path):
+                os.remove(compact_model_path)
+            print(f"⚠️  紧凑模型与sklearn预测最大偏差 {compact_diff:.2e} 超过容差 "
+                  f"{self.COMPACT_MODEL_TOLERANCE:.0e}，未导出紧凑模型")
         
         # 7. Generate Prediction Comparison Chart
         print("\n[Step 7] Generating prediction comparison chart...")
-        plt.figure(figsize=(15, 6))
+        fig = plt.figure(figsize=(15, 6))
         
         # Actual vs Predicted
         plt.subplot(1, 2, 1)
@@ -812,19 +1586,19 @@ class AgriPriceDataGenerator:
         
         plt.tight_layout()
         prediction_plot = os.path.join(models_dir, 'model_prediction_comparison.png')
-        plt.savefig(prediction_plot, dpi=150, bbox_inches='tight')
-        plt.close()
+        self._save_figure('预测对比图', fig, prediction_plot, dpi=150, bbox_inches='tight')
+        plt.close(fig)
         print(f"✓ 预测对比图已保存: {prediction_plot}")
         
         # 8. 生成模型评估报告
         report_path = os.path.join(models_dir, 'model_evaluation_report.txt')
-        with open(report_path, 'w', encoding='utf-8') as f:
+        with io.StringIO() as f:
             f.write("="*80 + "\n")
             f.write("农产品市场预测模型评估报告\n")
             f.write("="*80 + "\n\n")
             f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"训练样本数: {len(X_train)}\n")
-            f.write(f"测试样本数: {len(X_test)}\n")
+            f.write(f"训练样本数: {len(X_train_scaled)}\n")
+            f.write(f"测试样本数: {len(X_test_scaled)}\n")
             f.write(f"特征数量: {len(feature_columns)}\n\n")
             
             f.write("特征列表:\n")
@@ -848,17 +1622,403 @@ class AgriPriceDataGenerator:
             f.write(f"最佳模型: {best_model[0]}\n")
             f.write(f"最佳R²得分: {best_score:.4f}\n")
             f.write("="*80 + "\n")
+
+            self._save_artifact('评估报告', BackgroundWriter.write_text_file, report_path, f.getvalue())
         
         print(f"✓ 模型评估报告已保存: {report_path}")
+
+        # 9. 滚动起点回测（全部模型一次批量预测，按预测步长统计指标）
+        print("\n[步骤9] 滚动起点回测...")
+        self.backtest_models({name: result['model'] for name, result in results.items()}, features)
         
         print("\n" + "="*80)
         print("【任务5完成】数据建模与评估成功！")
         print(f"✓ 训练了 {len(models)} 个模型")
         print(f"✓ 最佳模型: {best_model[0]} (R² = {best_score:.4f})")
         print("="*80)
-        
+
         return results
 
+    def update_online_model(self, full_retrain_every=30, full_retrain_epochs=200, force_full_retrain=False):
+        """
+        任务5（增量模式）：基于partial_fit的在线模型更新
+        - 使用SGDRegressor + 增量StandardScaler，只用新增日期的数据更新已保存的模型
+        - 累计增量行数达到 full_retrain_every 时，在全部历史上周期性全量重训
+        - 状态中保存已训练历史行的摘要；特征仓库中这些行发生变化（如重新生成数据）时视为过期，全量重训
+        - 特征直接读取特征仓库最新版本，与离线训练保持一致
+        - 模型状态经后台写入器保存；同一实例内连续更新时直接使用内存中的最新状态，不等待写盘
+        """
+        print("\n" + "="*80)
+        print("【任务5-增量】在线模型更新 (SGDRegressor.partial_fit)")
+        print("="*80)
+
+        models_dir = os.path.join(os.path.dirname(__file__), 'models')
+        os.makedirs(models_dir, exist_ok=True)
+        state_path = os.path.join(models_dir, 'online_price_model.pkl')
+
+        features = FeatureStore().load()
+        X_raw = features['X_raw']
+        y = features['y']
+        dates = features['dates']
+
+        state = self.online_state
+        if state is None and os.path.exists(state_path):
+            state = joblib.load(state_path)
+
+        history_changed = False
+        if state is not None:
+            # 已训练过的行须与仓库中对应的行完全一致，否则模型拟合的是已不存在的数据
+            seen_rows = int(np.searchsorted(dates, np.datetime64(state['last_date'], 'D'), side='right'))
+            history_changed = (
+                seen_rows != state.get('history_rows')
+                or self._history_digest(X_raw, y, seen_rows) != state.get('history_digest')
+            )
+            if history_changed:
+                print(f"\n⚠️  已训练的历史数据已变化（特征仓库版本 {state.get('feature_store_version')} → "
+                      f"{features['version']}），将全量重训")
+
+        need_full = (
+            force_full_retrain
+            or state is None
+            or history_changed
+            or state['feature_columns'] != features['feature_columns']
+            or state['rows_since_full_retrain'] >= full_retrain_every
+        )
+
+        if need_full:
+            print(f"\n[全量重训] 使用全部 {len(X_raw)} 条历史数据训练...")
+            scaler = StandardScaler().partial_fit(X_raw)
+            target_scaler = StandardScaler().partial_fit(y.reshape(-1, 1))
+            model = SGDRegressor(learning_rate='constant', eta0=0.01, alpha=1e-6, random_state=42)
+
+            X_scaled = scaler.transform(X_raw)
+            y_scaled = target_scaler.transform(y.reshape(-1, 1)).ravel()
+            for _ in range(full_retrain_epochs):
+                model.partial_fit(X_scaled, y_scaled)
+
+            state = {
+                'model': model,
+                'scaler': scaler,
+                'target_scaler': target_scaler,
+                'feature_columns': features['feature_columns'],
+                'n_samples_seen': int(len(X_raw)),
+                'rows_since_full_retrain': 0,
+                'last_full_retrain': str(dates[-1]),
+            }
+            print(f"✓ 全量训练完成（{full_retrain_epochs} 轮）")
+        else:
+            # 只取上次更新之后的新日期（日期有序，二分查找定位）
+            start = np.searchsorted(dates, np.datetime64(state['last_date'], 'D'), side='right')
+            X_new = np.asarray(X_raw[start:])
+            y_new = np.asarray(y[start:]).reshape(-1, 1)
+
+            if len(X_new) == 0:
+                print(f"\n✓ 无新增数据（最新日期 {state['last_date']}），模型保持不变")
+                return state
+
+            model = state['model']
+            scaler = state['scaler']
+            target_scaler = state['target_scaler']
+
+            # 先用旧模型预测新数据，得到前向验证误差，再更新模型
+            y_pred = target_scaler.inverse_transform(
+                model.predict(scaler.transform(X_new)).reshape(-1, 1)
+            ).ravel()
+            new_mae = mean_absolute_error(y_new.ravel(), y_pred)
+
+            scaler.partial_fit(X_new)
+            target_scaler.partial_fit(y_new)
+            model.partial_fit(scaler.transform(X_new), target_scaler.transform(y_new).ravel())
+
+            state['n_samples_seen'] += int(len(X_new))
+            state['rows_since_full_retrain'] += int(len(X_new))
+            print(f"\n[增量更新] 新增 {len(X_new)} 条数据")
+            print(f"✓ 更新前在新数据上的 MAE: {new_mae:.4f}")
+            print(f"✓ 距离下次全量重训: {max(0, full_retrain_every - state['rows_since_full_retrain'])} 条")
+
+        state['last_date'] = str(dates[-1])
+        state['feature_store_version'] = features['version']
+        state['history_rows'] = int(len(X_raw))
+        state['history_digest'] = self._history_digest(X_raw, y, len(X_raw))
+        self.online_state = state
+        # 写入快照：后续更新会原地修改 state，不能与后台写盘同时进行
+        self._save_artifact('在线模型', joblib.dump, copy.deepcopy(state), state_path)
+        print(f"✓ 在线模型已保存: {state_path}")
+
+        print("\n" + "="*80)
+        print("【任务5-增量完成】在线模型更新成功！")
+        print("="*80)
+
+        return state
+
+    @staticmethod
+    def _history_digest(X_raw, y, n_rows):
+        """前 n_rows 行特征与目标值的内容摘要"""
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(X_raw[:n_rows], dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(y[:n_rows], dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def forecast_from_feature_store(self, start_date=None, end_date=None, model_path=None):
+        """
+        使用已保存的最佳模型进行预测
+        - 按模型文件记录的版本读取特征仓库，特征与标准化参数和训练时完全一致
+        - 日期范围通过二分查找定位，只切片内存映射视图
+        """
+        if model_path is None:
+            model_path = os.path.join(os.path.dirname(__file__), 'models', 'best_price_prediction_model.pkl')
+        bundle = joblib.load(model_path)
+        features = FeatureStore().load(bundle.get('feature_store_version'))
+
+        dates = features['dates']
+        lo = 0 if start_date is None else np.searchsorted(dates, np.datetime64(start_date, 'D'), side='left')
+        hi = len(dates) if end_date is None else np.searchsorted(dates, np.datetime64(end_date, 'D'), side='right')
+
+        predictions = bundle['model'].predict(features['X'][lo:hi])
+        return pd.DataFrame({
+            'date': dates[lo:hi],
+            'actual': features['y'][lo:hi],
+            'predicted': predictions
+        })
+
+    # ========================================================================
+    # 异常与事件检测 (NumPy向量化)
+    # ========================================================================
+
+    def detect_price_anomalies(self, df, window=30, tolerance=1):
+        """
+        对价格指数和各产品价格序列进行异常检测
+        - 滚动z分数、MAD稳健分数、均值漂移变点分数（AnomalyDetector向量化批量计算）
+        - 任一序列超过阈值即记为异常日，与生成器写入的 event 标签对比计算精确率/召回率
+        - 逐日明细保存为 data/anomaly_detection.csv
+        """
+        print("\n" + "="*80)
+        print("【异常检测】价格序列异常与事件检测 (NumPy)")
+        print("="*80)
+
+        series_cols = ['index_value'] + [col for col in df.columns if col.endswith('_price')]
+        values = df[series_cols].to_numpy(dtype=np.float64)
+        event_mask = df['event'].notna().to_numpy()
+
+        detector = AnomalyDetector(window=window)
+        scores, flags = detector.detect(values)
+        print(f"\n✓ 检测序列: {len(series_cols)} 个，样本: {len(values)} 天，窗口: {window} 天")
+
+        result = pd.DataFrame({'date': df['date'], 'event': df['event']})
+        metrics = {}
+        print(f"\n检测效果（真值为生成器事件标签，容差 ±{tolerance} 天）:")
+        print("-" * 80)
+        for method in AnomalyDetector.METHODS:
+            day_flags = flags[method].any(axis=1)
+            metrics[method] = AnomalyDetector.evaluate(day_flags, event_mask, tolerance=tolerance)
+            result[f'{method}_score'] = scores[method].max(axis=1).round(3)
+            result[f'{method}_flag'] = day_flags
+            print(f"  {method:12s} 异常日: {metrics[method]['flagged_days']:4d}  "
+                  f"精确率: {metrics[method]['precision']:.3f}  召回率: {metrics[method]['recall']:.3f}")
+        print("-" * 80)
+        print(f"✓ 真实事件天数: {int(event_mask.sum())}")
+
+        output_dir = os.path.join(os.path.dirname(__file__), 'data')
+        os.makedirs(output_dir, exist_ok=True)
+        anomaly_file = os.path.join(output_dir, 'anomaly_detection.csv')
+        self._save_artifact('异常检测CSV', result.to_csv, anomaly_file, index=False, encoding='utf-8-sig')
+        print(f"✓ 异常检测结果已保存: {anomaly_file}")
+
+        print("\n" + "="*80)
+        print("【异常检测完成】")
+        print("="*80)
+
+        return metrics
+
+    # ========================================================================
+    # 产品相关性随时间演变 (增量滚动/扩展相关矩阵)
+    # ========================================================================
+
+    def analyze_rolling_correlation(self, df, window=30, max_products=50, max_heatmap_products=20):
+        """
+        逐日计算产品价格的滚动与扩展相关矩阵
+        - RollingCorrelation 每天 O(产品数²) 增量更新，不重算整段历史
+        - 结果为 float32 (天数 × 序列数 × 序列数) 数组，直接写入 .npy 内存映射文件，可用 np.load(mmap_mode='r') 按天读取
+        - 产品数超过 max_products 时（如上千SKU的商品目录），改为计算品类平均价格之间的相关性；
+          没有商品目录时只取前 max_products 个产品，避免生成数GB的稠密数组
+        - 每月月末取滚动相关快照，生成带时间轴的 pyecharts 热力图
+        """
+        print("\n" + "="*80)
+        print("【相关性演变】产品价格滚动/扩展相关矩阵 (NumPy增量计算)")
+        print("="*80)
+
+        price_cols = [col for col in df.columns if col.endswith('_price')]
+        values = df[price_cols].to_numpy(dtype=np.float64)
+        labels = [col[:-len('_price')] for col in price_cols]
+        level = 'product'
+
+        if len(price_cols) > max_products and self.catalog is not None:
+            category_of = dict(zip((f'{key}_price' for key in self.catalog.keys), self.catalog.category_index))
+            column_categories = np.array([category_of.get(col, -1) for col in price_cols])
+            present = [i for i in range(len(self.catalog.category_names)) if (column_categories == i).any()]
+            values = np.column_stack([values[:, column_categories == i].mean(axis=1) for i in present])
+            labels = [str(self.catalog.category_names[i]) for i in present]
+            level = 'category'
+            print(f"✓ 产品数 {len(price_cols)} 超过上限 {max_products}，改为计算 {len(labels)} 个品类平均价格的相关性")
+        if values.shape[1] > max_products:
+            print(f"⚠️  序列数 {values.shape[1]} 超过上限 {max_products}，只计算前 {max_products} 个")
+            values = values[:, :max_products]
+            labels = labels[:max_products]
+
+        dates = pd.to_datetime(df['date'])
+        n_days, n_products = values.shape
+
+        data_dir = os.path.join(os.path.dirname(__file__), 'data')
+        os.makedirs(data_dir, exist_ok=True)
+        rolling_file = os.path.join(data_dir, f'rolling_correlation_{window}d.npy')
+        expanding_file = os.path.join(data_dir, 'expanding_correlation.npy')
+
+        shape = (n_days, n_products, n_products)
+        rolling = np.lib.format.open_memmap(rolling_file, mode='w+', dtype=np.float32, shape=shape)
+        expanding = np.lib.format.open_memmap(expanding_file, mode='w+', dtype=np.float32, shape=shape)
+
+        start_time = time.perf_counter()
+        RollingCorrelation.compute(values, window=window, out=rolling)
+        RollingCorrelation.compute(values, window=None, out=expanding)
+        elapsed = time.perf_counter() - start_time
+        rolling.flush()
+        expanding.flush()
+        print(f"✓ {'品类' if level == 'category' else '产品'}: {n_products} 个，样本: {n_days} 天，"
+              f"滚动窗口: {window} 天，耗时: {elapsed:.2f} 秒")
+        print(f"✓ 滚动相关矩阵已保存: {rolling_file} ({rolling.nbytes / 1024**2:.1f} MB)")
+        print(f"✓ 扩展相关矩阵已保存: {expanding_file} ({expanding.nbytes / 1024**2:.1f} MB)")
+
+        meta_file = os.path.join(data_dir, 'correlation_meta.json')
+        meta = {
+            'window': window,
+            'level': level,
+            'series': labels,
+            'dates': dates.dt.strftime('%Y-%m-%d').tolist(),
+            'files': {'rolling': os.path.basename(rolling_file), 'expanding': os.path.basename(expanding_file)},
+        }
+        self._save_artifact('相关矩阵元数据', BackgroundWriter.write_text_file, meta_file,
+                            json.dumps(meta, ensure_ascii=False, indent=2))
+
+        # 平均两两相关的变化，便于在控制台快速观察
+        upper = np.triu_indices(n_products, k=1)
+        mean_corr = np.nanmean(rolling[:, upper[0], upper[1]], axis=1) if n_products > 1 else np.full(n_days, np.nan)
+        valid = ~np.isnan(mean_corr)
+        if valid.any():
+            print(f"✓ 滚动平均两两相关: 最低 {np.nanmin(mean_corr):.3f} / 最高 {np.nanmax(mean_corr):.3f} "
+                  f"/ 最新 {mean_corr[valid][-1]:.3f}")
+
+        # 时间轴热力图：每月最后一天的滚动相关快照
+        shown = min(n_products, max_heatmap_products)
+        heatmap_labels = labels[:shown]
+        periods = dates.dt.to_period('M').to_numpy()
+        month_ends = np.flatnonzero(np.r_[periods[1:] != periods[:-1], True])
+
+        timeline = Timeline(init_opts=opts.InitOpts(width="900px", height="700px"))
+        timeline.add_schema(is_auto_play=False, play_interval=1000)
+        for idx in month_ends:
+            if idx + 1 < window:
+                continue
+            snapshot = np.nan_to_num(rolling[idx, :shown, :shown], nan=0.0)
+            heat_data = [[i, j, round(float(snapshot[i, j]), 3)] for i in range(shown) for j in range(shown)]
+            heatmap = (
+                HeatMap()
+                .add_xaxis(heatmap_labels)
+                .add_yaxis("相关系数", heatmap_labels, heat_data)
+                .set_global_opts(
+                    title_opts=opts.TitleOpts(title="产品价格滚动相关性",
+                                              subtitle=f"{window}天窗口，截至 {dates.iloc[idx]:%Y-%m-%d}"),
+                    visualmap_opts=opts.VisualMapOpts(min_=-1, max_=1, is_calculable=True),
+                    xaxis_opts=opts.AxisOpts(axislabel_opts=opts.LabelOpts(rotate=45)),
+                )
+            )
+            timeline.add(heatmap, f"{dates.iloc[idx]:%Y-%m}")
+
+        html_dir = os.path.join(os.path.dirname(__file__), 'visualizations')
+        os.makedirs(html_dir, exist_ok=True)
+        timeline_output = os.path.join(html_dir, 'correlation_timeline_pyecharts.html')
+        self._save_artifact('相关性时间轴HTML', BackgroundWriter.write_text_file, timeline_output,
+                            timeline.render_embed())
+        print(f"✓ 相关性时间轴热力图已保存: {timeline_output}")
+
+        print("\n" + "="*80)
+        print("【相关性演变完成】")
+        print("="*80)
+
+        return rolling, expanding
+
+    # ========================================================================
+    # 滚动起点回测 (批量预测矩阵 + NumPy向量化指标)
+    # ========================================================================
+
+    def backtest_models(self, models, features, horizon=14, step=1, min_history=30):
+        """
+        对已训练的全部模型做滚动起点回测
+        - RollingOriginBacktest 一次生成所有起点 × 步长的预测矩阵，逐步长计算各项指标
+        - 主要指标只统计样本外预测（目标日在测试集）；目标日在训练集的样本内结果单独列出，仅供参考
+        - 指标写入 models/backtest_results.json，预测矩阵按列写入 models/backtest_predictions.npz
+        """
+        start_time = time.perf_counter()
+        backtest = RollingOriginBacktest(horizon=horizon, step=step, min_history=min_history)
+        result = backtest.run(models, features)
+        elapsed = time.perf_counter() - start_time
+
+        n_models, n_origins, n_steps = result['predictions'].shape
+        print(f"✓ 模型: {n_models} 个（含持平基线），起点: {n_origins} 个，步长: 1-{n_steps} 天，"
+              f"共 {n_models * result['valid'].sum()} 个预测，耗时 {elapsed:.2f} 秒")
+
+        shown_steps = sorted({1, min(7, n_steps), n_steps})
+        for segment, label in (('out_of_sample', '样本外（目标日在测试集）'),
+                               ('in_sample', '样本内（目标日在训练集，仅供参考）')):
+            metrics = result['metrics'][segment]
+            print(f"\n{label} MAE（h=1 样本数: {result['counts'][segment][0]}）:")
+            print(f"  {'模型':8s}" + "".join(f"{f'h={h}':>10s}" for h in shown_steps))
+            for i, name in enumerate(result['models']):
+                print(f"  {name:8s}" + "".join(f"{metrics['mae'][i, h - 1]:10.3f}" for h in shown_steps))
+
+        def to_list(values):
+            return [None if np.isnan(v) else round(float(v), 6) for v in values]
+
+        summary = {
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'feature_store_version': features['version'],
+            'horizon': n_steps,
+            'step': step,
+            'min_history': min_history,
+            'n_origins': n_origins,
+            'first_origin': str(result['origin_dates'][0]) if n_origins else None,
+            'last_origin': str(result['origin_dates'][-1]) if n_origins else None,
+            'models': result['models'],
+            'horizons': result['horizons'].tolist(),
+            'primary_segment': 'out_of_sample',
+            'segments': RollingOriginBacktest.SEGMENTS,
+            'counts': {segment: counts.tolist() for segment, counts in result['counts'].items()},
+            'metrics': {
+                segment: {
+                    name: {metric: to_list(values[i]) for metric, values in metrics.items()}
+                    for i, name in enumerate(result['models'])
+                }
+                for segment, metrics in result['metrics'].items()
+            },
+        }
+
+        models_dir = os.path.join(os.path.dirname(__file__), 'models')
+        os.makedirs(models_dir, exist_ok=True)
+        results_path = os.path.join(models_dir, 'backtest_results.json')
+        self._save_artifact('回测指标', BackgroundWriter.write_text_file, results_path,
+                            json.dumps(summary, ensure_ascii=False, indent=2))
+        predictions_path = os.path.join(models_dir, 'backtest_predictions.npz')
+        self._save_artifact('回测预测矩阵', np.savez, predictions_path,
+                            models=np.asarray(result['models']),
+                            horizons=result['horizons'],
+                            origin_dates=result['origin_dates'],
+                            actual=result['actual'],
+                            valid=result['valid'],
+                            predictions=result['predictions'].astype(np.float32))
+        print(f"\n✓ 回测指标已保存: {results_path}")
+        print(f"✓ 回测预测矩阵已保存: {predictions_path}")
+
+        return result
+
 
 def main():
     """
@@ -874,7 +2034,9 @@ def main():
     print("  4. 【任务5】使用sklearn进行机器学习建模")
     print("="*80 + "\n")
     
-    generator = AgriPriceDataGenerator()
+    # 产出文件交给后台线程池写盘，最后统一等待（特征仓库与相关矩阵内存映射文件除外，需在计算中直接读写）
+    writer = BackgroundWriter(max_workers=4)
+    generator = AgriPriceDataGenerator(writer=writer)
     
     # ============ 步骤1：生成原始数据 ============
     print("\n【步骤1】生成原始数据...")
@@ -894,20 +2056,45 @@ def main():
     except Exception as e:
         print(f"\n⚠️  任务3执行出错: {str(e)}")
         print("跳过后续任务...")
+        writer.close()
         return
     
-    # ============ 步骤5：任务4 - 数据可视化 ============
+    # ============ 步骤5-7：任务4 / 任务5 并行（各自独立子进程） ============
+    # 可视化与建模只读取同一份预处理数据，经内存映射共享给子进程（不传递用不到的文本列）
+    print("\n【步骤5-7】并行运行可视化与建模阶段...")
+    shared_df = SharedFrame(df, drop_columns=AgriPriceDataGenerator.TEXT_COLUMNS)
+    shared_corr = SharedFrame(correlation_matrix)
+    scheduler = StageScheduler()
+    scheduler.add('任务4 数据可视化', generator.run_stage, 'visualize_data', shared_df, shared_corr)
+    scheduler.add('任务5 机器学习建模', generator.run_stage, 'build_prediction_models', shared_df)
+    scheduler.add('任务5 在线模型更新', generator.run_stage, 'update_online_model', deps=('任务5 机器学习建模',))
+    stage_write_failures = 0
     try:
-        generator.visualize_data(df, correlation_matrix)
+        outcomes = scheduler.run()
+        stage_write_failures = sum(len(outcome['write_failures']) for outcome in outcomes.values())
     except Exception as e:
-        print(f"\n⚠️  任务4执行出错: {str(e)}")
-        print("继续执行任务5...")
-    
-    # ============ 步骤6：任务5 - 机器学习建模 ============
+        print(f"\n⚠️  阶段调度出错: {str(e)}")
+    finally:
+        shared_df.close()
+        shared_corr.close()
+
+    # ============ 步骤8：异常与事件检测 ============
     try:
-        results = generator.build_prediction_models(df)
+        generator.detect_price_anomalies(df)
     except Exception as e:
-        print(f"\n⚠️  任务5执行出错: {str(e)}")
+        print(f"\n⚠️  异常检测出错: {str(e)}")
+
+    # ============ 步骤9：产品相关性随时间演变 ============
+    try:
+        generator.analyze_rolling_correlation(df)
+    except Exception as e:
+        print(f"\n⚠️  相关性演变分析出错: {str(e)}")
+
+    # ============ 步骤10：等待后台写入完成 ============
+    print("\n【步骤10】等待后台写入完成...")
+    write_errors = writer.close()
+    if write_errors or stage_write_failures:
+        print(f"⚠️  {len(write_errors) + stage_write_failures} 个文件写入失败")
     
     # ============ 完成 ============
     print("\n" + "="*80)
@@ -917,15 +2104,22 @@ def main():
     print("  📄 数据文件:")
     print("     - data/agri_price_mock_data.json (供后端使用)")
     print("     - data/processed_data.csv (预处理后的数据)")
+    print("     - data/price_index.idx + price_values.bin (二进制日期/产品索引)")
+    print("     - data/anomaly_detection.csv (异常检测结果)")
+    print("     - data/rolling_correlation_30d.npy / expanding_correlation.npy (逐日相关矩阵)")
     print("\n  📊 可视化文件:")
     print("     - visualizations/price_analysis_matplotlib.png")
     print("     - visualizations/price_trend_pyecharts.html")
     print("     - visualizations/monthly_stats_pyecharts.html")
     print("     - visualizations/change_distribution_pyecharts.html")
+    print("     - visualizations/correlation_timeline_pyecharts.html")
     print("\n  🤖 模型文件:")
     print("     - models/best_price_prediction_model.pkl")
+    print("     - models/best_price_prediction_model.npz (紧凑模型)")
+    print("     - models/online_price_model.pkl")
     print("     - models/model_prediction_comparison.png")
     print("     - models/model_evaluation_report.txt")
+    print("     - models/backtest_results.json / backtest_predictions.npz (滚动起点回测)")
     print("\n" + "="*80)
     print("💡 提示:")
     print("  - JSON数据格式未变，前后端可以正常使用")
@@ -0,0 +1,207 @@
+"""
+价格数据二进制索引与按需查询
+
+流水线在预处理数据旁写出两个文件：
+- 数值文件（.bin）：价格指数与各产品价格，按列（产品）连续存放的 float64
+- 索引文件（.idx）：按日期排序的日序号 → 行偏移，以及每列在数值文件中的字节偏移
+
+查询时索引以内存映射方式打开，按日期二分查找，只读取所需的字节，无需解析整个JSON/CSV。
+本模块只依赖NumPy。
+"""
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+MAGIC = b'AGRIIDX1'
+FORMAT_VERSION = 1
+VALUE_DTYPE = np.dtype('<f8')
+
+
+def _align8(n):
+    return (n + 7) // 8 * 8
+
+
+def _to_day(value):
+    """日期（字符串 / date / datetime / Timestamp / datetime64）→ 自1970-01-01起的天数"""
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def write_price_index(index_path, values_path, dates, values, columns):
+    """
+    写出数值文件与排序索引文件
+    - dates: 长度 n 的日期序列；values: (n, 列数) 矩阵；columns: 列名
+    - 数值文件保持原始行顺序，索引中的日序号排序后记录各自的行偏移
+    - 两个文件都先写临时文件再 os.replace() 替换，读取方不会打开写了一半的文件
+    """
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    values = np.asarray(values, dtype=VALUE_DTYPE)
+    n_rows, n_cols = values.shape
+    if len(days) != n_rows or len(columns) != n_cols:
+        raise ValueError("日期、数值矩阵与列名的长度不一致")
+
+    order = np.argsort(days, kind='stable')
+    sections = {}
+    offset = 0
+    arrays = [
+        ('days', days[order].astype('<i4')),
+        ('rows', order.astype('<i8')),
+        ('column_offsets', (np.arange(n_cols, dtype=np.int64) * n_rows * VALUE_DTYPE.itemsize).astype('<i8')),
+    ]
+    for name, array in arrays:
+        sections[name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset = _align8(offset + array.nbytes)
+
+    header = json.dumps({
+        'format_version': FORMAT_VERSION,
+        'values_file': os.path.basename(values_path),
+        'value_dtype': VALUE_DTYPE.str,
+        'n_rows': n_rows,
+        'columns': list(columns),
+        'sections': sections,
+    }, ensure_ascii=False).encode('utf-8')
+
+    # 各段偏移相对于头部之后按8字节对齐的数据起点
+    data_start = _align8(len(MAGIC) + 4 + len(header))
+    index_tmp = f'{index_path}.tmp'
+    values_tmp = f'{values_path}.tmp'
+    with open(values_tmp, 'wb') as f:
+        f.write(np.ascontiguousarray(values.T).tobytes())
+    with open(index_tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, array in arrays:
+            f.seek(data_start + sections[name]['offset'])
+            f.write(array.tobytes())
+
+    # 先替换数值文件、再替换索引：新索引出现时它引用的数值文件已完整
+    os.replace(values_tmp, values_path)
+    os.replace(index_tmp, index_path)
+    return index_path
+
+
+class PriceIndex:
+    """
+    基于二进制索引的价格查询
+    - lookup(date, column) 单点查询；query_range(start, end, columns) 日期区间查询（闭区间）
+    - 索引与数值文件均为内存映射，二分查找只触及 O(log n) 个索引页，数值只读取命中的行
+    - 列名可写完整列名（如 'pork_price'）或产品键（如 'pork'）
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是价格索引文件: {index_path}")
+            header_length = int.from_bytes(f.read(4), 'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"不支持的价格索引格式版本: {header['format_version']}")
+
+        self.header = header
+        self.columns = header['columns']
+        self.n_rows = header['n_rows']
+        self._column_positions = {name: i for i, name in enumerate(self.columns)}
+        self._value_dtype = np.dtype(header['value_dtype'])
+
+        data_start = _align8(len(MAGIC) + 4 + header_length)
+        with open(index_path, 'rb') as f:
+            self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        sections = {
+            name: np.frombuffer(self._index_map, dtype=np.dtype(section['dtype']), count=section['length'],
+                                offset=data_start + section['offset'])
+            for name, section in header['sections'].items()
+        }
+        self.days = sections['days']
+        self.rows = sections['rows']
+        self.column_offsets = sections['column_offsets']
+
+        values_path = os.path.join(os.path.dirname(os.path.abspath(index_path)), header['values_file'])
+        expected_size = self.n_rows * len(self.columns) * self._value_dtype.itemsize
+        if os.path.getsize(values_path) != expected_size:
+            raise ValueError(f"数值文件大小与索引不一致（可能正在重新生成）: {values_path}")
+        # 空文件无法映射；没有数据行时也不需要读取数值
+        self._values_map = None
+        if expected_size > 0:
+            with open(values_path, 'rb') as f:
+                self._values_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.n_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # 先释放引用索引缓冲区的数组，mmap 才能关闭
+        self.days = self.rows = self.column_offsets = None
+        self._index_map.close()
+        if self._values_map is not None:
+            self._values_map.close()
+
+    @property
+    def date_range(self):
+        if self.n_rows == 0:
+            return None, None
+        return (np.datetime64(int(self.days[0]), 'D'), np.datetime64(int(self.days[-1]), 'D'))
+
+    def _column_position(self, column):
+        if column in self._column_positions:
+            return self._column_positions[column]
+        if f'{column}_price' in self._column_positions:
+            return self._column_positions[f'{column}_price']
+        raise KeyError(f"索引中没有该列: {column}")
+
+    def _read(self, column, rows):
+        """读取某列在给定行上的值；行号连续时一次读取整段"""
+        position = self._column_position(column)
+        base = int(self.column_offsets[position])
+        itemsize = self._value_dtype.itemsize
+        if len(rows) == 0:
+            return np.empty(0, dtype=self._value_dtype)
+        first = int(rows[0])
+        if np.all(np.diff(rows) == 1):
+            return np.frombuffer(self._values_map, dtype=self._value_dtype, count=len(rows),
+                                 offset=base + first * itemsize).copy()
+        return np.array([
+            np.frombuffer(self._values_map, dtype=self._value_dtype, count=1, offset=base + int(row) * itemsize)[0]
+            for row in rows
+        ], dtype=self._value_dtype)
+
+    def _bounds(self, start, end):
+        lo = 0 if start is None else int(np.searchsorted(self.days, _to_day(start), side='left'))
+        hi = self.n_rows if end is None else int(np.searchsorted(self.days, _to_day(end), side='right'))
+        return lo, max(lo, hi)
+
+    def lookup(self, date, column=None):
+        """
+        单点查询
+        - 指定 column 时返回该日的数值，否则返回 {列名: 数值}
+        - 日期不存在时抛出 KeyError
+        """
+        lo, hi = self._bounds(date, date)
+        if lo == hi:
+            raise KeyError(f"索引中没有该日期: {np.datetime64(date, 'D')}")
+        rows = self.rows[lo:lo + 1]
+        if column is not None:
+            return float(self._read(column, rows)[0])
+        return {name: float(self._read(name, rows)[0]) for name in self.columns}
+
+    def query_range(self, start=None, end=None, columns=None):
+        """
+        日期区间查询（含两端），返回 (datetime64[D] 日期数组, {列名: 数值数组})
+        - start / end 为 None 时不限制该端；columns 为 None 时返回全部列
+        """
+        lo, hi = self._bounds(start, end)
+        rows = self.rows[lo:hi]
+        dates = self.days[lo:hi].astype('datetime64[D]')
+        if columns is None:
+            columns = self.columns
+        elif isinstance(columns, str):
+            columns = [columns]
+        return dates, {column: self._read(column, rows) for column in columns}
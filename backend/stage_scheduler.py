@@ -0,0 +1,190 @@
+"""
+阶段调度与跨进程共享DataFrame
+
+互不依赖的流水线阶段在独立子进程中并发运行：
+- SharedFrame：DataFrame 各列写入临时目录下的内存映射 .npy 文件，子进程只读打开，不经pickle复制
+- StageScheduler：小型阶段DAG调度器，每个阶段独占一个 spawn 子进程，出错只影响自身及其下游阶段
+"""
+
+import io
+import os
+import time
+import shutil
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+
+class SharedFrame:
+    """
+    DataFrame 的跨进程共享描述
+    - 数值/日期列按 dtype 分组，写入临时目录下的列优先 .npy 文件，子进程以 mmap_mode='r' 打开，不经pickle复制
+    - 字符串、分类等列编码为整数代码写入同样的内存映射文件，只有去重后的类别列表随对象pickle
+    - drop_columns 指定阶段不需要的列（如 title、url、products），不参与共享
+    - to_frame() 在子进程中还原为 DataFrame，数值列直接引用内存映射（只读）
+    """
+
+    def __init__(self, df, base_dir=None, drop_columns=()):
+        df = df.drop(columns=[col for col in drop_columns if col in df.columns])
+        self.directory = tempfile.mkdtemp(prefix='agri_frame_', dir=base_dir)
+        self.columns = list(df.columns)
+        self.index = df.index
+        self.layout = {}
+        # 编码列: 列名 -> (类别列表, 原始dtype)
+        self.encoded = {}
+
+        arrays = {}
+        for col in self.columns:
+            series = df[col]
+            dtype = series.dtype
+            if isinstance(dtype, np.dtype) and dtype.kind in 'biufmM':
+                arrays[col] = series.to_numpy()
+                continue
+            try:
+                codes, categories = pd.factorize(series, use_na_sentinel=True)
+            except TypeError:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                raise ValueError(f"列 {col} 含不可哈希的对象，无法共享，请通过 drop_columns 去除")
+            arrays[col] = codes.astype(np.int32)
+            self.encoded[col] = (list(categories), dtype)
+
+        groups = {}
+        for col, values in arrays.items():
+            groups.setdefault(values.dtype.str, []).append(col)
+
+        for i, (dtype_str, cols) in enumerate(groups.items()):
+            filename = f'block_{i}.npy'
+            # 列优先存放：每列在文件中连续，还原后的列视图无需拷贝
+            block = np.lib.format.open_memmap(
+                os.path.join(self.directory, filename), mode='w+', dtype=np.dtype(dtype_str),
+                shape=(len(df), len(cols)), fortran_order=True,
+            )
+            for j, col in enumerate(cols):
+                block[:, j] = arrays[col]
+                self.layout[col] = (filename, j)
+            block.flush()
+            del block
+
+    def to_frame(self):
+        blocks = {}
+        data = {}
+        for col in self.columns:
+            filename, j = self.layout[col]
+            if filename not in blocks:
+                blocks[filename] = np.load(os.path.join(self.directory, filename), mmap_mode='r')
+            values = blocks[filename][:, j]
+            if col in self.encoded:
+                categories, dtype = self.encoded[col]
+                values = pd.Categorical.from_codes(values, categories=categories)
+                if not isinstance(dtype, pd.CategoricalDtype):
+                    values = pd.Series(values, index=self.index).astype(dtype)
+            data[col] = values
+        return pd.DataFrame(data, index=self.index, columns=self.columns, copy=False)
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StageWriteError(RuntimeError):
+    """阶段内有产出文件写入失败；write_failures 为失败文件的描述列表"""
+
+    def __init__(self, write_failures, cause=None):
+        self.write_failures = list(write_failures)
+        message = f"{len(self.write_failures)} 个文件写入失败（{', '.join(self.write_failures)}）"
+        if cause is not None:
+            message += f"；{cause}"
+        super().__init__(message)
+
+
+def _run_stage(func, args, kwargs):
+    """
+    阶段子进程入口：还原共享DataFrame参数，缓存控制台输出并捕获异常
+    - 返回 (结果, 输出, 错误信息, 写入失败的文件描述列表)
+    """
+    args = [arg.to_frame() if isinstance(arg, SharedFrame) else arg for arg in args]
+    kwargs = {key: value.to_frame() if isinstance(value, SharedFrame) else value for key, value in kwargs.items()}
+    log = io.StringIO()
+    result, error, write_failures = None, None, []
+    with contextlib.redirect_stdout(log):
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            error = str(e)
+            write_failures = getattr(e, 'write_failures', [])
+    return result, log.getvalue(), error, write_failures
+
+
+class StageScheduler:
+    """
+    小型阶段DAG调度器
+    - add() 登记阶段及其依赖（依赖须先登记，保证无环）
+    - 依赖全部成功的阶段在独立子进程中运行，互不依赖的阶段并发执行
+    - 每个阶段独占一个进程：某阶段出错甚至进程崩溃，只影响它自己和依赖它的阶段
+    - 子进程的控制台输出先缓存，阶段结束后整段打印，避免多进程输出交错
+    - 参数中的 SharedFrame 在子进程内还原为 DataFrame
+    """
+
+    def __init__(self, max_workers=None):
+        # None 表示不限制同时运行的阶段数（阶段数量本身很少）
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add(self, name, func, *args, deps=(), **kwargs):
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"阶段 [{name}] 依赖未登记的阶段: {', '.join(unknown)}")
+        self.stages[name] = (func, args, kwargs, tuple(deps))
+
+    def run(self):
+        """
+        运行全部阶段，返回 {阶段名: {'status': 'ok'/'failed'/'skipped', 'result', 'error', 'write_failures', 'seconds'}}
+        - 子进程统一使用 spawn 启动，不继承父进程的线程池等状态
+        """
+        context = multiprocessing.get_context('spawn')
+        pending = dict(self.stages)
+        running = {}
+        outcomes = {}
+
+        while pending or running:
+            for name, (func, args, kwargs, deps) in list(pending.items()):
+                failed = [dep for dep in deps if dep in outcomes and outcomes[dep]['status'] != 'ok']
+                if failed:
+                    del pending[name]
+                    outcomes[name] = {'status': 'skipped', 'result': None, 'write_failures': [],
+                                      'error': f"依赖阶段未成功: {', '.join(failed)}", 'seconds': 0.0}
+                    print(f"\n⚠️  阶段 [{name}] 已跳过: {outcomes[name]['error']}")
+                elif all(dep in outcomes for dep in deps) and (
+                        self.max_workers is None or len(running) < self.max_workers):
+                    del pending[name]
+                    executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+                    future = executor.submit(_run_stage, func, args, kwargs)
+                    running[future] = (name, executor, time.perf_counter())
+                    print(f"▶ 阶段 [{name}] 已启动（独立进程）")
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, executor, start = running.pop(future)
+                outcome = {'status': 'ok', 'result': None, 'error': None, 'write_failures': []}
+                try:
+                    outcome['result'], log, outcome['error'], outcome['write_failures'] = future.result()
+                    print(log, end='')
+                except Exception as e:
+                    outcome['error'] = str(e) or type(e).__name__
+                executor.shutdown(wait=True)
+                outcome['seconds'] = time.perf_counter() - start
+
+                if outcome['error'] is not None:
+                    outcome['status'] = 'failed'
+                    print(f"\n⚠️  阶段 [{name}] 执行出错: {outcome['error']}")
+                else:
+                    print(f"✓ 阶段 [{name}] 完成，耗时 {outcome['seconds']:.2f} 秒")
+                outcomes[name] = outcome
+
+        return outcomes